@@ -1,4 +1,6 @@
-from services.app import app
+from services.app import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True, port=8000)
\ No newline at end of file
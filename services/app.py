@@ -1,33 +1,61 @@
 import logging
 import os
-from flask import Flask, render_template, request, jsonify 
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, stream_template, stream_with_context
+import io
 from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
 from .config import Config
-from .models import Database, Member, AttendanceLog, PaymentLog
+from .models import Database, Member, AttendanceLog, PaymentLog, CheckInResult, DailyRollup, FeePlan, FeeSchedule, cache_stats
+from . import metrics
+from .events import EVENTS
+from .backup import BackupScheduler
 from .logger_setup import LoggerSetup
+from .bulk_io import EXPORT_TABLES, MIMETYPES, RESULT_COLUMNS, detect_format, export_table, format_rows, import_members, read_records
 
-# Inisialisasi Aplikasi Flask
-app = Flask(__name__,
-            template_folder=os.path.join(Config.TEMPLATE_DIR),
-            static_folder=os.path.join(Config.STATIC_DIR))
+# Semua route didaftarkan pada blueprint; aplikasi dibuat oleh create_app()
+bp = Blueprint('fms', __name__)
 
- # Inisialisasi database
-Database.init_db()
+app_logger = logging.getLogger('app')
 
-# Set up logger
-app_logger = LoggerSetup.setup_logger('app', 'app.log')
 
+# Gauge untuk connection pool dan cache, dibaca setiap kali /metrics diminta
+metrics.REGISTRY.register(metrics.Gauge(
+    'fms_db_pool', 'SQLite connection pool counters.', ('stat',),
+    lambda: {(key,): value for key, value in Database.pool_stats().items()}
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    'fms_cache', 'Model cache counters.', ('cache', 'stat'),
+    lambda: {(cache, key): value for cache, stats in cache_stats().items() for key, value in stats.items()}
+))
 
-@app.template_filter('format_number')
+
+@bp.before_app_request
+def start_request_timer():
+    if Config.METRICS_ENABLED:
+        metrics.begin_request()
+
+@bp.after_app_request
+def record_request_timer(response):
+    # Catat durasi per route dan (opsional) tambahkan header Server-Timing
+    stats = metrics.end_request() if Config.METRICS_ENABLED else None
+    if stats is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_request_duration.observe(stats['total'], route, request.method, response.status_code)
+        if Config.SERVER_TIMING_ENABLED:
+            response.headers['Server-Timing'] = metrics.server_timing_header(stats)
+    return response
+
+
+@bp.app_template_filter('format_number')
 def format_number(value):
     return f"{value:,}"
 
-@app.route('/')
+@bp.route('/')
 def home():
     app_logger.info("Home route accessed.")
-    return render_template('index.html', fees=Config.FEES)
+    return render_template('index.html', plans=FeeSchedule.current_plans())
 
-@app.route('/api/register', methods=['POST'])
+@bp.route('/api/register', methods=['POST'])
 def register_member() -> str:
     try:
         name = request.form.get('name')
@@ -39,110 +67,389 @@ def register_member() -> str:
         
         # Membuat anggota baru
         member = Member.create(name, transport)
-        app_logger.info(f"New member registered: {member.member_code}")
+        app_logger.info("New member registered: %s", member.member_code)
         return jsonify({'memberCode': member.member_code}), 201
     
+    except ValueError as e:
+        app_logger.warning("Register failed: %s", e)
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        app_logger.error(f"Error during member registration: {e}")
+        app_logger.error("Error during member registration: %s", e)
         return jsonify({'error': str(e)}), 500
     
-@app.route('/api/attendance', methods=['POST'])
+@bp.route('/api/members/import', methods=['POST'])
+def import_member_file():
+    # Bulk import anggota dari file CSV/NDJSON yang diunggah pada field "file".
+    # Hasil (kode anggota atau error per baris) dikirim balik secara streaming.
+    try:
+        upload = request.files.get('file')
+        if not upload:
+            app_logger.warning("Member import failed: Missing file.")
+            return jsonify({'error': 'Missing file'}), 400
+
+        fmt = detect_format(upload.filename, request.args.get('format'))
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+        results = import_members(read_records(stream, fmt))
+        app_logger.info("Member import started: %s", upload.filename)
+        return Response(
+            stream_with_context(format_rows(RESULT_COLUMNS, results, fmt)),
+            mimetype=MIMETYPES[fmt]
+        )
+
+    except ValueError as e:
+        app_logger.warning("Member import failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app_logger.error("Error during member import: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/export/<table_name>', methods=['GET'])
+def export_table_data(table_name):
+    # Ekspor tabel secara streaming sebagai CSV atau NDJSON
+    try:
+        if table_name not in EXPORT_TABLES:
+            return jsonify({'error': f'Unknown table: {table_name}'}), 404
+
+        fmt = detect_format(None, request.args.get('format'))
+        extension = 'csv' if fmt == 'csv' else 'ndjson'
+        app_logger.info("Export started for table: %s", table_name)
+        return Response(
+            stream_with_context(export_table(table_name, fmt)),
+            mimetype=MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename={table_name}.{extension}'}
+        )
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app_logger.error("Error during export of %s: %s", table_name, e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/attendance', methods=['POST'])
 def record_attendance() -> str:
     
     try:
         code = request.form.get('code')
-        now = datetime.now()
 
-        # Periksa apakah anggota terdaftar
-        member = Member.get_by_code(code)
-        if not member:
+        # Periksa anggota, tagihan tertunda dan visit_number, lalu catat
+        # kehadiran dalam satu transaksi
+        result = AttendanceLog.check_in(code)
+
+        if result.status == CheckInResult.INVALID_MEMBER:
             app_logger.warning("Attendance failed: Invalid member code.")
             return jsonify({'message': 'Invalid member code'}), 400
-        
-        # Periksa apakah ada pembayaran yang tertunda
-        payment_due = PaymentLog.get_unpaid(code)
-        if payment_due:
+
+        if result.status == CheckInResult.PAYMENT_REQUIRED:
             app_logger.warning("Attendance failed: Payment required.")
             return jsonify({'message': 'Payment required before recording additional attendance'}), 400
-        
-        
-        # Periksa waktu kehadiran yang terakhir
-        last_attendance = AttendanceLog.get_last_attendance(code)
-            
-        # if last_attendance:
-        #     time_since_last = now - last_attendance.timestamp
-        #     if time_since_last < timedelta(minutes=Config.ATTENDANCE_LIMIT_MINUTES):
-        #         time_left = timedelta(minutes=Config.ATTENDANCE_LIMIT_MINUTES) - time_since_last
-        #         formatted_time_left = str(time_left).split('.')[0]
-        #         return jsonify({
-        #             'message': f'Cannot record attendance. Try again in: {formatted_time_left}'
-        #         }), 400
-        
-        # Perbaharui attendance log, setiap kali anggota melakukan kehadiran
-        new_count = (last_attendance.visit_number + 1) if last_attendance else 1
-        AttendanceLog.create(code, new_count)
-
-        # Periksa apakah anggota sudah hadir selama 5 kali
-        need_payment = False
-        payment_amount = 0
-
-        if new_count % 5 == 0:
-            payment_amount = member.fee * 5
-            PaymentLog.create(code, payment_amount)
-            need_payment = True
-        
+
         response = {
             'message': 'Attendance Recorded', 
-            'needPayment': need_payment
+            'needPayment': result.need_payment
         }
         
-        if need_payment:
-            response['paymentAmount'] = payment_amount
+        if result.need_payment:
+            response['paymentAmount'] = result.payment_amount
 
-        app_logger.info(f"Attendance recorded for member: {code}")
+        app_logger.info("Attendance recorded for member: %s", code)
         return jsonify(response), 200
 
     except Exception as e:
-        app_logger.error(f"Error during attendance recording: {e}")
+        app_logger.error("Error during attendance recording: %s", e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/attendance-list', methods=['GET'])
+@bp.route('/api/attendance/batch', methods=['POST'])
+def record_attendance_batch() -> str:
+    # Replay check-in dari kiosk offline: JSON array berisi {code, timestamp}
+    try:
+        events = request.get_json(silent=True)
+        if isinstance(events, dict):
+            events = events.get('events')
+
+        if not isinstance(events, list):
+            app_logger.warning("Batch attendance failed: Body is not a JSON array of events.")
+            return jsonify({'message': 'Expected a JSON array of {code, timestamp} events'}), 400
+
+        if len(events) > Config.ATTENDANCE_BATCH_LIMIT:
+            app_logger.warning("Batch attendance failed: %s events exceeds the limit.", len(events))
+            return jsonify({'message': f'Batch exceeds the limit of {Config.ATTENDANCE_BATCH_LIMIT} events'}), 413
+
+        # Event yang tidak valid langsung ditolak, sisanya dicatat dalam satu transaksi
+        results = [None] * len(events)
+        valid_events = []
+        positions = []
+        for index, event in enumerate(events):
+            code = event.get('code') if isinstance(event, dict) else None
+            if not code:
+                results[index] = {'code': code, 'status': 'invalid_event', 'message': 'Missing member code'}
+                continue
+            if not isinstance(code, str):
+                results[index] = {'code': code, 'status': CheckInResult.INVALID_MEMBER, 'message': 'Member code must be a string'}
+                continue
+            try:
+                timestamp = event.get('timestamp')
+                timestamp = datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+            except (TypeError, ValueError):
+                results[index] = {'code': code, 'status': 'invalid_event', 'message': 'Invalid timestamp'}
+                continue
+            if timestamp.tzinfo is not None:
+                # Timestamp disimpan sebagai waktu lokal tanpa zona waktu, jadi
+                # timestamp dengan offset (mis. +07:00 atau Z) dikonversi dulu
+                timestamp = timestamp.astimezone().replace(tzinfo=None)
+            valid_events.append((code, timestamp.replace(microsecond=0)))
+            positions.append(index)
+
+        for index, result in zip(positions, AttendanceLog.check_in_batch(valid_events)):
+            results[index] = {
+                'code': events[index]['code'],
+                'status': result.status,
+                'visitNumber': result.visit_number,
+                'needPayment': result.need_payment,
+                'paymentAmount': result.payment_amount
+            }
+
+        recorded = sum(1 for result in results if result['status'] == CheckInResult.RECORDED)
+        app_logger.info("Batch attendance recorded: %s of %s events.", recorded, len(events))
+        return jsonify({'recorded': recorded, 'results': results}), 200
+
+    except Exception as e:
+        app_logger.error("Error during batch attendance recording: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+def get_report_params() -> dict:
+    # Membaca parameter pagination dan filter laporan dari query string
+    limit = request.args.get('limit', Config.REPORT_PAGE_SIZE, type=int)
+    if limit < 1:
+        raise ValueError('limit must be a positive number')
+
+    params = {
+        'limit': min(limit, Config.REPORT_MAX_PAGE_SIZE),
+        'cursor': request.args.get('cursor') or None,
+        'member_code': request.args.get('member_code') or None,
+        'date_from': request.args.get('from') or None,
+        'date_to': request.args.get('to') or None
+    }
+    for key in ('date_from', 'date_to'):
+        if params[key]:
+            params[key] = datetime.strptime(params[key], '%Y-%m-%d').strftime('%Y-%m-%d')
+    return params
+
+def render_report_page(template: str, rows_template: str, list_name: str, url: str, rows: list, next_cursor):
+    # Halaman pertama dirender sebagai tabel lengkap, halaman berikutnya hanya barisnya
+    # (ditambahkan ke tabel oleh main.js). Cursor halaman berikutnya dikirim lewat header.
+    if request.args.get('format') == 'json':
+        return jsonify({'items': [row._asdict() for row in rows], 'nextCursor': next_cursor})
+
+    if request.args.get('cursor'):
+        body = render_template(rows_template, **{list_name: rows})
+    else:
+        body = render_template(template, next_cursor=next_cursor, report_url=url,
+                               query=request.query_string.decode(), **{list_name: rows})
+    response = Response(body, mimetype='text/html')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def buffered(chunks, size: int = 8192):
+    # Menggabungkan potongan kecil hasil template menjadi blok yang lebih besar
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_report_download(name: str, template: str, list_name: str, keys: tuple, rows):
+    # Download seluruh laporan sebagai HTML atau CSV. Baris dibaca langsung dari
+    # cursor dan dikirim bertahap, sehingga memori tetap kecil untuk jutaan baris.
+    download = request.args.get('download')
+    if download == 'csv':
+        body = format_rows(list(keys), rows, 'csv')
+        mimetype = MIMETYPES['csv']
+    elif download == 'html':
+        body = buffered(stream_template(template, next_cursor=None, **{list_name: rows}))
+        mimetype = 'text/html'
+    else:
+        raise ValueError('download must be html or csv')
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={name}.{download}'}
+    )
+
+@bp.route('/api/attendance-list', methods=['GET'])
 def get_attendance_list() -> str:
     try:
-        data = AttendanceLog.get_all()
+        params = get_report_params()
+        if request.args.get('download'):
+            app_logger.info("Attendance list download started.")
+            rows = AttendanceLog.iter_all(params['member_code'], params['date_from'], params['date_to'])
+            return stream_report_download('attendance_list', 'table_attendance.html', 'attendance_list',
+                                          AttendanceLog.REPORT_KEYS, rows)
+
+        data, next_cursor = AttendanceLog.get_page(**params)
         app_logger.info("Attendance list retrieved.")
-        return render_template('table_attendance.html', attendance_list=data)
+        return render_report_page('table_attendance.html', 'rows_attendance.html', 'attendance_list',
+                                  '/api/attendance-list', data, next_cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/payment-list', methods=['GET'])
+@bp.route('/api/payment-list', methods=['GET'])
 def get_payment_list() -> str:
     try:
-        data = PaymentLog.get_all()
+        params = get_report_params()
+        status = request.args.get('status')
+        if status not in (None, '', 'paid', 'unpaid'):
+            raise ValueError('status must be paid or unpaid')
+        params['paid'] = {'paid': True, 'unpaid': False}.get(status)
+
+        if request.args.get('download'):
+            app_logger.info("Payment list download started.")
+            rows = PaymentLog.iter_all(params['member_code'], params['date_from'], params['date_to'], params['paid'])
+            return stream_report_download('payment_list', 'table_payment.html', 'payment_list',
+                                          PaymentLog.REPORT_KEYS, rows)
+
+        data, next_cursor = PaymentLog.get_page(**params)
         app_logger.info("Payment list retrieved.")
-        return render_template('table_payment.html', payment_list=data)
+        return render_report_page('table_payment.html', 'rows_payment.html', 'payment_list',
+                                  '/api/payment-list', data, next_cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/pay', methods=['POST'])
+@bp.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    # Ringkasan kunjungan dan pendapatan per hari dari tabel rollup.
+    # Default: 30 hari terakhir.
+    try:
+        today = datetime.now().date()
+        date_to = request.args.get('to') or today.strftime('%Y-%m-%d')
+        date_from = request.args.get('from') or (today - timedelta(days=29)).strftime('%Y-%m-%d')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').strftime('%Y-%m-%d')
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+        data = DailyRollup.get_dashboard(date_from, date_to)
+        app_logger.info("Dashboard retrieved.")
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app_logger.error("Error retrieving dashboard: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+def fee_plan_json(plan: FeePlan) -> Dict[str, Any]:
+    return {
+        'id': plan.id,
+        'transport': plan.transport,
+        'version': plan.version,
+        'fee': plan.fee,
+        'visitsPerPayment': plan.visits_per_payment,
+        'paymentAmount': plan.payment_amount,
+        'effectiveFrom': plan.effective_from
+    }
+
+@bp.route('/api/fee-plans', methods=['GET'])
+def get_fee_plans():
+    # Plan tarif yang berlaku sekarang; ?history=1 untuk semua versi
+    try:
+        plans = FeeSchedule.list_plans(include_history=request.args.get('history') == '1')
+        return jsonify({'items': [fee_plan_json(plan) for plan in plans]})
+    except Exception as e:
+        app_logger.error("Error retrieving fee plans: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/fee-plans', methods=['POST'])
+def add_fee_plan():
+    # Menambah versi tarif baru untuk satu transport. Tanpa effective_from,
+    # tarif langsung berlaku; check-in berikutnya memakai tarif baru.
+    try:
+        effective_from = request.form.get('effective_from')
+        if effective_from:
+            effective_from = datetime.fromisoformat(effective_from)
+        plan = FeeSchedule.add_plan(
+            request.form.get('transport'),
+            int(request.form.get('fee', '')),
+            int(request.form.get('visits_per_payment') or Config.VISITS_PER_PAYMENT),
+            effective_from or None
+        )
+        app_logger.info("Fee plan added: %s v%s", plan.transport, plan.version)
+        return jsonify(fee_plan_json(plan)), 201
+    except ValueError as e:
+        app_logger.warning("Adding fee plan failed: %s", e)
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app_logger.error("Error adding fee plan: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/events', methods=['GET'])
+def stream_events():
+    # Server-Sent Events untuk halaman reports: attendance baru, tagihan baru dan
+    # tagihan lunas. Client yang tersambung ulang melanjutkan dari Last-Event-ID.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    app_logger.info("Event stream opened.")
+    return Response(
+        stream_with_context(EVENTS.stream(last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Metrics dalam format teks Prometheus
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/pay', methods=['POST'])
 def pay_fee() -> str:
     try:
         code = request.form.get('code')
 
-        payment = PaymentLog.get_unpaid(code)
+        # Tagihan dibaca dan dilunasi langsung di database (bisa saja sudah dibayar
+        # lewat worker lain), bersama reset visit_number dalam satu transaksi
+        payment = PaymentLog.settle(code)
+        if payment is None:
+            app_logger.warning("Payment failed: No unpaid payment for member: %s", code)
+            return jsonify({'error': 'No unpaid payment'}), 400
 
-        # Tandai payment as paid, ketika anggota membayar tagihannya
-        payment.mark_as_paid()
-
-        # Reset visit_number
-        last_attendance = AttendanceLog.get_last_attendance(code)
-        if last_attendance:
-            last_attendance.reset_visit_number(0)
-        
-        app_logger.info(f"Payment proccessed for member: {code}")
+        app_logger.info("Payment proccessed for member: %s", code)
         return jsonify({'message':  'Payment proceed successfully'})
     
     except Exception as e:
-        app_logger.error(f"Error processing payment: {e}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        app_logger.error("Error processing payment: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    # Application factory, dipakai oleh app_runner.py (development) dan
+    # services/wsgi.py (gunicorn/waitress). Inisialisasi database hanya dijalankan
+    # sekali per proses; migrasi sendiri aman dijalankan bersamaan oleh beberapa
+    # worker karena memakai BEGIN IMMEDIATE.
+    # config berisi override Config, mis. create_app({'DB_PATH': ':memory:'}).
+    if config:
+        Config.update(config)
+        if any(key.startswith('LOG_') for key in config):
+            LoggerSetup.reload()
+
+    app = Flask(__name__,
+                template_folder=os.path.join(Config.TEMPLATE_DIR),
+                static_folder=os.path.join(Config.STATIC_DIR))
+
+    # Set up logger
+    LoggerSetup.setup_logger('app', 'app.log')
+
+    # Inisialisasi database
+    Database.ensure_initialized()
+
+    app.register_blueprint(bp)
+
+    # Mulai backup terjadwal (jika BACKUP_INTERVAL_MINUTES diatur)
+    BackupScheduler.start()
+    return app
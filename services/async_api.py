@@ -0,0 +1,225 @@
+# Versi ASGI dari API untuk gerbang check-in dengan banyak koneksi bersamaan.
+# Jalankan dengan server ASGI (install terpisah), contoh:
+#   uvicorn services.async_api:app --port 8001
+# Endpoint dan respons JSON sama dengan services/app.py; halaman HTML dan
+# import/export tetap dilayani oleh aplikasi Flask.
+import io
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs
+from werkzeug.formparser import MultiPartParser
+from werkzeug.http import parse_options_header
+from .config import Config
+from .models import Database, CheckInResult
+from . import metrics
+from .logger_setup import LoggerSetup
+from .async_models import DatabaseExecutor, AsyncMember, AsyncAttendanceLog, AsyncPaymentLog, AsyncDailyRollup
+
+app_logger = logging.getLogger('app')
+
+
+class UnsupportedMediaType(Exception):
+    # Body yang tidak bisa dibaca sebagai form (dijawab dengan 415)
+    pass
+
+
+class Request:
+    # Request HTTP sederhana: query string dan form (urlencoded atau multipart)
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+        self.body = body
+
+    @cached_property
+    def form(self) -> Dict[str, str]:
+        # Sama seperti request.form di Flask; multipart dibaca dengan parser Werkzeug
+        # (field file diabaikan). Body dengan content type lain ditolak.
+        mimetype, options = parse_options_header(self.headers.get('content-type', ''))
+        if mimetype == 'application/x-www-form-urlencoded':
+            return {key: values[0] for key, values in parse_qs(self.body.decode()).items()}
+        if mimetype == 'multipart/form-data':
+            if not options.get('boundary'):
+                raise ValueError('Missing multipart boundary')
+            form, _ = MultiPartParser().parse(io.BytesIO(self.body), options['boundary'].encode('latin-1'), len(self.body))
+            return form.to_dict()
+        if self.body:
+            raise UnsupportedMediaType(mimetype or 'missing content type')
+        return {}
+
+
+def report_params(request: Request) -> Dict[str, Any]:
+    # Sama dengan get_report_params() di services/app.py
+    limit = int(request.args.get('limit', Config.REPORT_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('limit must be a positive number')
+
+    params = {
+        'limit': min(limit, Config.REPORT_MAX_PAGE_SIZE),
+        'cursor': request.args.get('cursor') or None,
+        'member_code': request.args.get('member_code') or None,
+        'date_from': request.args.get('from') or None,
+        'date_to': request.args.get('to') or None
+    }
+    for key in ('date_from', 'date_to'):
+        if params[key]:
+            params[key] = datetime.strptime(params[key], '%Y-%m-%d').strftime('%Y-%m-%d')
+    return params
+
+
+async def register_member(request: Request) -> Tuple[int, Dict]:
+    name = request.form.get('name')
+    transport = request.form.get('transport')
+
+    if not name or not transport:
+        app_logger.warning("Register failed: Missing name or transport type.")
+        return 400, {'error': 'Missing Name or transport type'}
+
+    member = await AsyncMember.create(name, transport)
+    app_logger.info("New member registered: %s", member.member_code)
+    return 201, {'memberCode': member.member_code}
+
+
+async def record_attendance(request: Request) -> Tuple[int, Dict]:
+    code = request.form.get('code')
+    result = await AsyncAttendanceLog.check_in(code)
+
+    if result.status == CheckInResult.INVALID_MEMBER:
+        app_logger.warning("Attendance failed: Invalid member code.")
+        return 400, {'message': 'Invalid member code'}
+
+    if result.status == CheckInResult.PAYMENT_REQUIRED:
+        app_logger.warning("Attendance failed: Payment required.")
+        return 400, {'message': 'Payment required before recording additional attendance'}
+
+    response = {
+        'message': 'Attendance Recorded',
+        'needPayment': result.need_payment
+    }
+    if result.need_payment:
+        response['paymentAmount'] = result.payment_amount
+
+    app_logger.info("Attendance recorded for member: %s", code)
+    return 200, response
+
+
+async def pay_fee(request: Request) -> Tuple[int, Dict]:
+    code = request.form.get('code')
+    payment = await AsyncPaymentLog.settle(code)
+    if payment is None:
+        app_logger.warning("Payment failed: No unpaid payment for member: %s", code)
+        return 400, {'error': 'No unpaid payment'}
+
+    app_logger.info("Payment proccessed for member: %s", code)
+    return 200, {'message': 'Payment proceed successfully'}
+
+
+async def get_attendance_list(request: Request) -> Tuple[int, Dict]:
+    data, next_cursor = await AsyncAttendanceLog.get_page(**report_params(request))
+    return 200, {'items': [row._asdict() for row in data], 'nextCursor': next_cursor}
+
+
+async def get_payment_list(request: Request) -> Tuple[int, Dict]:
+    params = report_params(request)
+    status = request.args.get('status')
+    if status not in (None, '', 'paid', 'unpaid'):
+        raise ValueError('status must be paid or unpaid')
+    params['paid'] = {'paid': True, 'unpaid': False}.get(status)
+
+    data, next_cursor = await AsyncPaymentLog.get_page(**params)
+    return 200, {'items': [row._asdict() for row in data], 'nextCursor': next_cursor}
+
+
+async def get_dashboard(request: Request) -> Tuple[int, Dict]:
+    today = datetime.now().date()
+    date_to = request.args.get('to') or today.strftime('%Y-%m-%d')
+    date_from = request.args.get('from') or (today - timedelta(days=29)).strftime('%Y-%m-%d')
+    date_from = datetime.strptime(date_from, '%Y-%m-%d').strftime('%Y-%m-%d')
+    date_to = datetime.strptime(date_to, '%Y-%m-%d').strftime('%Y-%m-%d')
+    return 200, await AsyncDailyRollup.get_dashboard(date_from, date_to)
+
+
+ROUTES = {
+    ('POST', '/api/register'): register_member,
+    ('POST', '/api/attendance'): record_attendance,
+    ('POST', '/api/pay'): pay_fee,
+    ('GET', '/api/attendance-list'): get_attendance_list,
+    ('GET', '/api/payment-list'): get_payment_list,
+    ('GET', '/api/dashboard'): get_dashboard
+}
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_response(send, status: int, body: bytes, content_type: str) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            DatabaseExecutor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def startup() -> None:
+    # Setara dengan create_app(): logger, inisialisasi database dan executor
+    LoggerSetup.setup_logger('app', 'app.log')
+    Database.ensure_initialized()
+    DatabaseExecutor.start()
+
+
+async def app(scope, receive, send) -> None:
+    # Aplikasi ASGI 3
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    if scope['path'] == '/metrics':
+        await send_response(send, 200, metrics.REGISTRY.render().encode(), 'text/plain; version=0.0.4')
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        status, payload = 404, {'error': 'Not found'}
+    else:
+        request = Request(scope, await read_body(receive))
+        try:
+            status, payload = await handler(request)
+        except UnsupportedMediaType as e:
+            status, payload = 415, {'error': f"Unsupported content type: {e}"}
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            app_logger.error("Error handling %s %s: %s", request.method, request.path, e)
+            status, payload = 500, {'error': str(e)}
+
+    await send_response(send, status, json.dumps(payload).encode(), 'application/json')
+    if Config.METRICS_ENABLED:
+        route = scope['path'] if handler is not None else 'unmatched'
+        metrics.http_request_duration.observe(time.perf_counter() - started, route, scope['method'], status)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import Config
+from .models import AttendanceLog, CheckInResult, DailyRollup, Member, PaymentLog
+
+
+class DatabaseExecutor:
+    # Menjalankan pekerjaan database di luar event loop. Semua operasi tulis
+    # lewat satu thread penulis, sehingga write di dalam proses ini berurutan dan
+    # tidak saling menunggu lock SQLite. Operasi baca memakai pool thread sendiri
+    # (WAL mengizinkan banyak pembaca bersamaan dengan satu penulis).
+    _writer: Optional[ThreadPoolExecutor] = None
+    _readers: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start() -> None:
+        with DatabaseExecutor._lock:
+            if DatabaseExecutor._writer is None:
+                DatabaseExecutor._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+            if DatabaseExecutor._readers is None:
+                DatabaseExecutor._readers = ThreadPoolExecutor(
+                    max_workers=Config.ASYNC_READER_THREADS, thread_name_prefix='db-reader'
+                )
+
+    @staticmethod
+    def shutdown() -> None:
+        with DatabaseExecutor._lock:
+            for executor in (DatabaseExecutor._writer, DatabaseExecutor._readers):
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            DatabaseExecutor._writer = None
+            DatabaseExecutor._readers = None
+
+    @staticmethod
+    def _reset_after_fork() -> None:
+        # Thread executor tidak ikut ter-fork; proses anak membuat executor sendiri
+        DatabaseExecutor._writer = None
+        DatabaseExecutor._readers = None
+        DatabaseExecutor._lock = threading.Lock()
+
+    @staticmethod
+    async def write(func: Callable, *args, **kwargs) -> Any:
+        if DatabaseExecutor._writer is None:
+            DatabaseExecutor.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(DatabaseExecutor._writer, partial(func, *args, **kwargs))
+
+    @staticmethod
+    async def read(func: Callable, *args, **kwargs) -> Any:
+        if DatabaseExecutor._readers is None:
+            DatabaseExecutor.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(DatabaseExecutor._readers, partial(func, *args, **kwargs))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=DatabaseExecutor._reset_after_fork)
+
+
+class AsyncMember:
+    # Versi async dari Member (semantik sama, dijalankan di DatabaseExecutor)
+    @staticmethod
+    async def create(name: str, transport: str) -> Member:
+        return await DatabaseExecutor.write(Member.create, name, transport)
+
+    @staticmethod
+    async def get_by_code(member_code: str) -> Optional[Member]:
+        return await DatabaseExecutor.read(Member.get_by_code, member_code)
+
+
+class AsyncAttendanceLog:
+    # Versi async dari AttendanceLog
+    @staticmethod
+    async def check_in(member_code: str) -> CheckInResult:
+        return await DatabaseExecutor.write(AttendanceLog.check_in, member_code)
+
+    @staticmethod
+    async def check_in_batch(events: List[tuple]) -> List[CheckInResult]:
+        return await DatabaseExecutor.write(AttendanceLog.check_in_batch, events)
+
+    @staticmethod
+    async def get_last_attendance(member_code: str) -> Optional[AttendanceLog]:
+        return await DatabaseExecutor.read(AttendanceLog.get_last_attendance, member_code)
+
+    @staticmethod
+    async def get_page(limit: int, cursor: Optional[str] = None, member_code: Optional[str] = None,
+                       date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[List[AttendanceLog.Row], Optional[str]]:
+        return await DatabaseExecutor.read(AttendanceLog.get_page, limit, cursor, member_code, date_from, date_to)
+
+
+class AsyncPaymentLog:
+    # Versi async dari PaymentLog
+    @staticmethod
+    async def get_unpaid(member_code: str) -> Optional[PaymentLog]:
+        return await DatabaseExecutor.read(PaymentLog.get_unpaid, member_code)
+
+    @staticmethod
+    async def settle(member_code: str) -> Optional[PaymentLog]:
+        return await DatabaseExecutor.write(PaymentLog.settle, member_code)
+
+    @staticmethod
+    async def get_page(limit: int, cursor: Optional[str] = None, member_code: Optional[str] = None,
+                       date_from: Optional[str] = None, date_to: Optional[str] = None,
+                       paid: Optional[bool] = None) -> Tuple[List[PaymentLog.Row], Optional[str]]:
+        return await DatabaseExecutor.read(PaymentLog.get_page, limit, cursor, member_code, date_from, date_to, paid)
+
+
+class AsyncDailyRollup:
+    @staticmethod
+    async def get_dashboard(date_from: str, date_to: str) -> Dict[str, Any]:
+        return await DatabaseExecutor.read(DailyRollup.get_dashboard, date_from, date_to)
@@ -0,0 +1,226 @@
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+from .config import Config
+from .models import Database, Member, BillingState, FeeSchedule, models_logger
+
+
+class Backup:
+    # Backup online memakai SQLite backup API. Halaman database disalin bertahap
+    # (BACKUP_PAGES_PER_STEP halaman per langkah), sehingga check-in tetap bisa
+    # berjalan selama backup.
+
+    @staticmethod
+    def list() -> List[str]:
+        # Daftar file backup, dari yang paling lama
+        return sorted(glob.glob(os.path.join(Config.BACKUP_DIR, 'backup_*.db')))
+
+    @staticmethod
+    def verify(path: str) -> bool:
+        # Memeriksa integritas snapshot dengan PRAGMA integrity_check
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            models_logger.error("Backup verification failed for %s: %s", path, e)
+            return False
+
+        if result != 'ok':
+            models_logger.error("Backup integrity check failed for %s: %s", path, result)
+            return False
+        return True
+
+    @staticmethod
+    def _copy(source: sqlite3.Connection, target: sqlite3.Connection) -> None:
+        # Dalam mode WAL seluruh database disalin dalam satu langkah: langkah itu
+        # hanya memegang snapshot baca, jadi penulis tidak terblokir, dan salinan
+        # tidak diulang dari awal setiap kali ada write. Mode journal lain disalin
+        # bertahap (agar write tetap bisa berjalan), tetapi setiap write dari
+        # koneksi lain mengulang salinan dari halaman 0, jadi dibatasi dengan
+        # BACKUP_MAX_SECONDS dan gagal dengan jelas jika terlewati.
+        mode = source.execute('PRAGMA journal_mode').fetchone()[0]
+        if mode.lower() == 'wal':
+            source.backup(target, pages=-1)
+            return
+
+        deadline = time.monotonic() + Config.BACKUP_MAX_SECONDS
+
+        def check_deadline(status, remaining, total):
+            if time.monotonic() > deadline:
+                raise sqlite3.OperationalError(
+                    f"Backup did not finish within {Config.BACKUP_MAX_SECONDS}s "
+                    f"({remaining} of {total} pages left); the database is written too often for a stepped copy"
+                )
+
+        source.backup(
+            target,
+            pages=Config.BACKUP_PAGES_PER_STEP,
+            progress=check_deadline,
+            sleep=Config.BACKUP_STEP_SLEEP_SECONDS
+        )
+
+    @staticmethod
+    def create() -> str:
+        # Membuat snapshot baru di BACKUP_DIR, lalu memverifikasinya sebelum dipakai
+        os.makedirs(Config.BACKUP_DIR, exist_ok=True)
+        path = os.path.join(Config.BACKUP_DIR, f"backup_{datetime.now().strftime('%Y%m%d%H%M%S')}.db")
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(Config.BACKUP_DIR, f"backup_{datetime.now().strftime('%Y%m%d%H%M%S')}_{suffix}.db")
+            suffix += 1
+
+        partial = path + '.partial'
+        database, uri = Database.connect_target()
+        source = sqlite3.connect(database, uri=uri)
+        target = sqlite3.connect(partial)
+        try:
+            Backup._copy(source, target)
+            # Snapshot disimpan sebagai satu file, tanpa -wal/-shm
+            target.execute('PRAGMA journal_mode = DELETE')
+        except sqlite3.Error as e:
+            target.close()
+            os.remove(partial)
+            models_logger.error("Error creating backup: %s", e)
+            raise
+        finally:
+            source.close()
+        target.close()
+
+        if not Backup.verify(partial):
+            os.remove(partial)
+            raise sqlite3.DatabaseError(f'Backup failed integrity check: {path}')
+
+        os.replace(partial, path)
+        models_logger.info("Backup created: %s", path)
+        return path
+
+    @staticmethod
+    def prune(keep: Optional[int] = None) -> List[str]:
+        # Menghapus backup lama, hanya menyisakan `keep` backup terbaru
+        keep = Config.BACKUP_RETENTION if keep is None else keep
+        backups = Backup.list()
+        removed = backups[:-keep] if keep > 0 else backups
+        for path in removed:
+            os.remove(path)
+            models_logger.info("Backup pruned: %s", path)
+        return removed
+
+    @staticmethod
+    def restore(path: str) -> None:
+        # Mengembalikan database dari snapshot. Snapshot diverifikasi dulu, lalu
+        # disalin ke database aktif lewat backup API (bukan menimpa file).
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        if not Backup.verify(path):
+            raise sqlite3.DatabaseError(f'Backup failed integrity check: {path}')
+
+        source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        database, uri = Database.connect_target()
+        target = sqlite3.connect(database, uri=uri, timeout=Config.SQLITE_PRAGMAS.get('busy_timeout', 5000) / 1000)
+        try:
+            source.backup(target)
+        except sqlite3.Error as e:
+            models_logger.error("Error restoring backup %s: %s", path, e)
+            raise
+        finally:
+            source.close()
+            target.close()
+
+        # Data berubah total: kosongkan cache dan koneksi yang menganggur
+        Database.close_pool()
+        Member.cache.clear()
+        BillingState.cache.clear()
+        Database.init_db()
+        FeeSchedule.invalidate()
+        models_logger.info("Database restored from backup: %s", path)
+
+
+class BackupScheduler:
+    # Thread latar yang membuat snapshot setiap BACKUP_INTERVAL_MINUTES dan
+    # menjalankan prune setelahnya
+    _thread = None
+    _stop = threading.Event()
+
+    @staticmethod
+    def _run(interval: float) -> None:
+        while not BackupScheduler._stop.wait(interval):
+            try:
+                Backup.create()
+                Backup.prune()
+            except Exception as e:
+                models_logger.error("Scheduled backup failed: %s", e)
+
+    @staticmethod
+    def start() -> bool:
+        # Mulai scheduler jika diaktifkan di Config (hanya sekali per proses)
+        if not Config.BACKUP_INTERVAL_MINUTES or BackupScheduler._thread is not None:
+            return False
+        BackupScheduler._stop.clear()
+        BackupScheduler._thread = threading.Thread(
+            target=BackupScheduler._run,
+            args=(Config.BACKUP_INTERVAL_MINUTES * 60,),
+            name='backup-scheduler',
+            daemon=True
+        )
+        BackupScheduler._thread.start()
+        models_logger.info("Backup scheduler started (every %s minutes)", Config.BACKUP_INTERVAL_MINUTES)
+        return True
+
+    @staticmethod
+    def stop() -> None:
+        BackupScheduler._stop.set()
+        if BackupScheduler._thread is not None:
+            BackupScheduler._thread.join()
+            BackupScheduler._thread = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Online backup and restore for the fee management database.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('create', help='Create a verified snapshot in the backup directory')
+    subparsers.add_parser('list', help='List snapshots')
+
+    verify_parser = subparsers.add_parser('verify', help='Run an integrity check on snapshots')
+    verify_parser.add_argument('files', nargs='*', help='Snapshots to check (default: all)')
+
+    prune_parser = subparsers.add_parser('prune', help='Delete old snapshots')
+    prune_parser.add_argument('--keep', type=int, default=Config.BACKUP_RETENTION)
+
+    restore_parser = subparsers.add_parser('restore', help='Restore the database from a snapshot')
+    restore_parser.add_argument('file')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        print(Backup.create())
+    elif args.command == 'list':
+        for path in Backup.list():
+            print(f"{path}  {os.path.getsize(path):>12} bytes")
+    elif args.command == 'verify':
+        failed = 0
+        for path in args.files or Backup.list():
+            ok = Backup.verify(path)
+            failed += not ok
+            print(f"{'ok    ' if ok else 'FAILED'} {path}")
+        return 1 if failed else 0
+    elif args.command == 'prune':
+        for path in Backup.prune(args.keep):
+            print(f"removed {path}")
+    elif args.command == 'restore':
+        Backup.restore(args.file)
+        print(f"Restored {Config.DB_PATH} from {args.file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from .config import Config
+from .logger_setup import LoggerSetup
+from . import synthetic
+
+
+# Menghitung persentil (nearest-rank) dari daftar latency yang sudah diurutkan
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+# Meringkas hasil pengukuran satu skenario
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'count': count,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(values) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if count else 0.0
+    }
+
+
+# Menjalankan operasi sebanyak iterations kali dan mengukur latency tiap operasi.
+# Operasi mengembalikan False (atau raise) jika gagal.
+def measure(operation: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            ok = operation(i)
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - t0)
+        if ok is False:
+            errors += 1
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+# Seperti measure(), tetapi dijalankan oleh beberapa thread sekaligus
+def measure_concurrent(operation: Callable[[int, int], Any], threads: int, iterations: int) -> Dict[str, Any]:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        local, local_errors = [], 0
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            try:
+                ok = operation(worker_id, i)
+            except Exception:
+                ok = False
+            local.append(time.perf_counter() - t0)
+            if ok is False:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    result = summarize(latencies, errors[0], time.perf_counter() - started)
+    result['threads'] = threads
+    return result
+
+
+# Seperti measure_concurrent(), tetapi dengan coroutine: `concurrency` task
+# berjalan bersamaan di satu event loop
+def measure_async(operation: Callable[[int, int], Awaitable[Any]], concurrency: int, iterations: int) -> Dict[str, Any]:
+    latencies, errors = [], [0]
+
+    async def worker(worker_id):
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            try:
+                ok = await operation(worker_id, i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            if ok is False:
+                errors[0] += 1
+
+    async def main():
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    result = summarize(latencies, errors[0], time.perf_counter() - started)
+    result['concurrency'] = concurrency
+    return result
+
+
+# Memanggil aplikasi ASGI secara langsung (tanpa server) dan mengembalikan (status, JSON)
+async def asgi_request(app, method: str, path: str, form: Optional[Dict[str, str]] = None) -> Tuple[int, Any]:
+    body = urlencode(form).encode() if form else b''
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+        'headers': [(b'content-type', b'application/x-www-form-urlencoded')]
+    }
+    sent = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            sent['status'] = message['status']
+        else:
+            sent['body'] = message.get('body', b'')
+
+    await app(scope, receive, send)
+    return sent['status'], json.loads(sent['body'])
+
+
+async def _status_ok(request: Awaitable[Tuple[int, Any]]) -> bool:
+    status, _ = await request
+    return status == 200
+
+
+def run(members: int, rows: int, iterations: int, threads: int, seed_value: int) -> Dict[str, Any]:
+    rng = random.Random(seed_value)
+    from .models import Database, Member, cache_stats
+    from .app import create_app
+
+    Database.init_db()
+    seed_started = time.perf_counter()
+    # Riwayat sintetis dengan semua tagihan sudah dibayar agar anggota bisa check-in
+    codes = synthetic.seed(members, rows, rng)
+    seed_elapsed = time.perf_counter() - seed_started
+
+    app = create_app()
+    client = app.test_client()
+    results = {}
+
+    results['member_create'] = measure(
+        lambda i: Member.create(f"Bench {i}", 'BUS') is not None, iterations
+    )
+
+    # Check-in berurutan; setiap tagihan yang muncul langsung dibayar lewat /api/pay
+    pay_latencies = []
+    checkin_codes = codes[:max(1, min(len(codes), iterations // Config.VISITS_PER_PAYMENT))]
+
+    def check_in(i):
+        code = checkin_codes[i % len(checkin_codes)]
+        response = client.post('/api/attendance', data={'code': code})
+        if response.status_code != 200:
+            return False
+        if response.get_json().get('needPayment'):
+            t0 = time.perf_counter()
+            client.post('/api/pay', data={'code': code})
+            pay_latencies.append(time.perf_counter() - t0)
+        return True
+
+    checkin_started = time.perf_counter()
+    results['attendance_checkin'] = measure(check_in, iterations)
+    results['pay'] = summarize(pay_latencies, 0, sum(pay_latencies))
+    results['attendance_checkin']['elapsed_including_pay_s'] = round(time.perf_counter() - checkin_started, 4)
+
+    for name, url in (
+        ('attendance_list', '/api/attendance-list'),
+        ('attendance_list_json', '/api/attendance-list?format=json'),
+        ('payment_list', '/api/payment-list'),
+        ('payment_list_json', '/api/payment-list?format=json')
+    ):
+        results[name] = measure(lambda i, url=url: client.get(url).status_code == 200, iterations)
+
+    # Check-in bersamaan: setiap thread memakai anggota yang berbeda
+    per_thread = max(1, iterations // threads)
+    thread_codes = [codes[(n * 7 + 1) % len(codes)] for n in range(threads)]
+
+    def concurrent_check_in(worker_id, i):
+        code = thread_codes[worker_id]
+        thread_client = app.test_client()
+        response = thread_client.post('/api/attendance', data={'code': code})
+        if response.status_code == 200 and response.get_json().get('needPayment'):
+            thread_client.post('/api/pay', data={'code': code})
+        return response.status_code == 200
+
+    results['attendance_checkin_concurrent'] = measure_concurrent(concurrent_check_in, threads, per_thread)
+    results['payment_list_concurrent'] = measure_concurrent(
+        lambda worker_id, i: app.test_client().get('/api/payment-list').status_code == 200, threads, per_thread
+    )
+
+    # Skenario yang sama lewat API async (services/async_api.py): satu event loop,
+    # satu thread penulis dan pool thread pembaca
+    from .async_api import app as async_app, startup
+    from .async_models import DatabaseExecutor
+    startup()
+    async_codes = [codes[(n * 7 + 3) % len(codes)] for n in range(threads)]
+
+    async def async_check_in(worker_id, i):
+        code = async_codes[worker_id]
+        status, body = await asgi_request(async_app, 'POST', '/api/attendance', {'code': code})
+        if status == 200 and body.get('needPayment'):
+            await asgi_request(async_app, 'POST', '/api/pay', {'code': code})
+        return status == 200
+
+    try:
+        results['attendance_checkin_async'] = measure_async(async_check_in, threads, per_thread)
+        results['payment_list_async'] = measure_async(
+            lambda worker_id, i: _status_ok(asgi_request(async_app, 'GET', '/api/payment-list?format=json')),
+            threads, per_thread
+        )
+    finally:
+        DatabaseExecutor.shutdown()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'members': members,
+            'rows': rows,
+            'iterations': iterations,
+            'threads': threads,
+            'seed': seed_value,
+            'seed_elapsed_s': round(seed_elapsed, 4)
+        },
+        'results': results,
+        'pool': Database.pool_stats(),
+        'cache': cache_stats()
+    }
+
+
+# Membandingkan hasil dengan file benchmark sebelumnya (perubahan p50/p95 dan throughput)
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for key in ('p50_ms', 'p95_ms', 'throughput_per_s'):
+            if old.get(key):
+                change = (result[key] - old[key]) / old[key] * 100
+                parts.append(f"{key} {old[key]} -> {result[key]} ({change:+.1f}%)")
+        lines.append(f"{name}: " + ', '.join(parts))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the model layer and Flask endpoints against a temporary database.')
+    parser.add_argument('--members', type=int, default=1000, help='Number of members to seed')
+    parser.add_argument('--rows', type=int, default=10000, help='Number of attendance rows to seed')
+    parser.add_argument('--iterations', type=int, default=200, help='Operations per scenario')
+    parser.add_argument('--threads', type=int, default=8, help='Threads for the concurrent scenarios')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    parser.add_argument('--memory', action='store_true', help='Run against an in-memory database instead of a temporary file')
+    args = parser.parse_args(argv)
+
+    # Database dan log benchmark ditulis ke direktori sementara,
+    # bukan ke data/memberships.db dan logs/. Config diubah sebelum models
+    # di-import; logger yang sudah terlanjur dibuat diarahkan ulang lewat reload().
+    workdir = tempfile.mkdtemp(prefix='fms-bench-')
+    Config.update({
+        'DB_PATH': ':memory:' if args.memory else os.path.join(workdir, 'bench.db'),
+        'LOG_PATH': workdir
+    })
+    LoggerSetup.reload()
+    from .models import Database
+    try:
+        report = run(args.members, args.rows, args.iterations, args.threads, args.seed)
+    finally:
+        Database.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report['results'].items():
+        print(f"{name:32} {result['count']:6} ops  {result['throughput_per_s']:10} ops/s  "
+              f"p50 {result['p50_ms']:8} ms  p95 {result['p95_ms']:8} ms  p99 {result['p99_ms']:8} ms  "
+              f"errors {result['errors']}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        for line in compare(report, baseline):
+            print(line)
+
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+from .config import Config
+from .models import Database, FeeSchedule, Member
+
+# Kolom yang diekspor untuk setiap tabel
+EXPORT_TABLES = {
+    'members': ['member_code', 'name', 'transport', 'fee'],
+    'attendance_log': ['id', 'member_code', 'visit_number', 'timestamp'],
+    'payment_log': ['id', 'member_code', 'payment_due', 'paid', 'timestamp']
+}
+FORMATS = ('csv', 'ndjson')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+RESULT_COLUMNS = ['line', 'name', 'transport', 'member_code', 'error']
+
+
+# Menentukan format file dari parameter atau ekstensi nama file
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    if fmt:
+        fmt = fmt.lower()
+    elif filename and os.path.splitext(filename)[1].lower() in ('.ndjson', '.jsonl'):
+        fmt = 'ndjson'
+    else:
+        fmt = 'csv'
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return fmt
+
+
+# Membaca record anggota satu per satu dari CSV (dengan header) atau NDJSON
+def read_records(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else {}
+
+
+# Memvalidasi satu record anggota, mengembalikan (name, transport)
+def validate_member(record: Dict[str, Any]) -> tuple:
+    # NDJSON bisa berisi tipe apa saja; selain string ditolak seperti baris invalid lain
+    for field in ('name', 'transport'):
+        if record.get(field) is not None and not isinstance(record.get(field), str):
+            raise ValueError(f"{field} must be a string")
+    name = (record.get('name') or '').strip()
+    transport = (record.get('transport') or '').strip().upper()
+
+    if not name:
+        raise ValueError('Missing name')
+    if transport not in FeeSchedule.transports():
+        raise ValueError(f"Invalid transport type: {record.get('transport')}")
+    return name, transport
+
+
+# Menyimpan satu potongan record valid dan mengembalikan hasilnya sesuai urutan baris
+def _flush_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    members = Member.create_many([(result['name'], result['transport']) for result in chunk])
+    for result, member in zip(chunk, members):
+        result['member_code'] = member.member_code
+    return chunk
+
+
+# Mengimpor anggota secara streaming: record divalidasi lalu disimpan per
+# potongan IMPORT_CHUNK_SIZE dalam satu transaksi. Hasil per baris di-yield
+# sehingga memori tetap kecil walaupun file berisi ratusan ribu anggota.
+# Baris yang ditolak langsung di-yield (tidak ikut ditahan di potongan), jadi
+# urutan hasil bisa berbeda dari urutan baris; kolom line menunjukkan barisnya.
+def import_members(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    chunk = []
+    for line, record in enumerate(records, start=1):
+        result = {'line': line, 'name': record.get('name'), 'transport': record.get('transport'),
+                  'member_code': None, 'error': None}
+        try:
+            result['name'], result['transport'] = validate_member(record)
+        except ValueError as e:
+            result['error'] = str(e)
+            yield result
+            continue
+        chunk.append(result)
+
+        if len(chunk) >= Config.IMPORT_CHUNK_SIZE:
+            yield from _flush_chunk(chunk)
+            chunk = []
+
+    if chunk:
+        yield from _flush_chunk(chunk)
+
+
+# Mengubah baris menjadi potongan teks CSV/NDJSON, per kelompok baris
+def format_rows(columns: List[str], rows: Iterable[Any], fmt: str, header: bool = True) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv' and header:
+        writer.writerow(columns)
+
+    for count, row in enumerate(rows, start=1):
+        if isinstance(row, dict):
+            row = [row[column] for column in columns]
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row))))
+            buffer.write('\n')
+
+        if count % Config.EXPORT_FETCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Mengiterasi isi tabel langsung dari cursor tanpa memuat seluruh tabel ke memori
+def iter_table(table_name: str) -> Iterator[tuple]:
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table_name}")
+
+    conn = Database.get_connection()
+    try:
+        c = conn.cursor()
+        c.row_factory = None
+        c.execute(f"SELECT {', '.join(EXPORT_TABLES[table_name])} FROM {table_name} ORDER BY rowid")
+        while True:
+            rows = c.fetchmany(Config.EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+# Mengekspor tabel sebagai aliran teks CSV/NDJSON
+def export_table(table_name: str, fmt: str) -> Iterator[str]:
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table_name}")
+    return format_rows(EXPORT_TABLES[table_name], iter_table(table_name), fmt)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Bulk import/export for the fee management database.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Import members from a CSV or NDJSON file')
+    import_parser.add_argument('file', help='Input file with name and transport columns (use - for stdin)')
+    import_parser.add_argument('--format', choices=FORMATS)
+    import_parser.add_argument('--output', help='Where to write the assigned member codes (default: stdout)')
+
+    export_parser = subparsers.add_parser('export', help='Export a table as CSV or NDJSON')
+    export_parser.add_argument('table', choices=sorted(EXPORT_TABLES))
+    export_parser.add_argument('--format', choices=FORMATS, default='csv')
+    export_parser.add_argument('--output', help='Output file (default: stdout)')
+
+    args = parser.parse_args(argv)
+    Database.init_db()
+
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.command == 'import':
+            fmt = detect_format(args.file, args.format)
+            source = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+            counts = {'imported': 0, 'rejected': 0}
+
+            def counted(results):
+                for result in results:
+                    counts['rejected' if result['error'] else 'imported'] += 1
+                    yield result
+
+            try:
+                results = import_members(read_records(source, fmt))
+                for text in format_rows(RESULT_COLUMNS, counted(results), fmt):
+                    output.write(text)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            print(f"Imported {counts['imported']} members, rejected {counts['rejected']} rows.", file=sys.stderr)
+        else:
+            for text in export_table(args.table, args.format):
+                output.write(text)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,132 @@
+import json
 import os
+from typing import Any, Dict
 
 class Config:
     # Definisikan konfigurasi untuk base direcctory
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(BASE_DIR, '..', 'data', 'memberships.db')
+    DB_PATH = os.path.join(BASE_DIR, '..', 'data', 'memberships.db')  # ':memory:' = database di memori
+    BACKUP_DIR = os.path.join(BASE_DIR, '..', 'data', 'backups')
     LOG_PATH = os.path.join(BASE_DIR, '..', 'logs')
 
+    # Konfigurasi logging
+    LOG_LEVEL = 'DEBUG'
+    LOG_LEVELS = {
+        'app': 'DEBUG',
+        'models': 'DEBUG'
+    }
+    LOG_ASYNC = True
+    LOG_ROTATION = 'size'  # 'size', 'time' atau None
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_ROTATE_WHEN = 'midnight'
+    LOG_BACKUP_COUNT = 7
+
     # Konfigurasi untuk template dan static folder
     TEMPLATE_DIR = os.path.join(BASE_DIR, '..', 'templates')
     STATIC_DIR = os.path.join(BASE_DIR, '..', 'static')
 
-    # variabel yang dibutuhkan
-    FEES = {
-        'BUS': 100000,
-        'TRAVEL': 50000
+    # Tarif diatur di tabel fee_plans (lihat /api/fee-plans). VISITS_PER_PAYMENT
+    # hanya nilai default untuk plan baru yang tidak menyebutkan siklusnya.
+    ATTENDANCE_LIMIT_MINUTES = 2
+    VISITS_PER_PAYMENT = 5
+
+    # Batas untuk replay check-in secara batch
+    ATTENDANCE_BATCH_LIMIT = 10000
+    BATCH_CHUNK_SIZE = 500
+
+    # Cache untuk data anggota dan state tagihan
+    CACHE_ENABLED = True
+    MEMBER_CACHE_SIZE = 10000
+    MEMBER_CACHE_TTL_SECONDS = 300
+    BILLING_CACHE_SIZE = 10000
+    BILLING_CACHE_TTL_SECONDS = 60
+    NEGATIVE_CACHE_TTL_SECONDS = 30
+    PRICING_CACHE_SIZE = 10000
+    PRICING_CACHE_TTL_SECONDS = 60
+
+    # Instrumentasi: metrics Prometheus di /metrics dan header Server-Timing
+    METRICS_ENABLED = True
+    SERVER_TIMING_ENABLED = False
+
+    # Backup online (0 = scheduler tidak aktif)
+    BACKUP_INTERVAL_MINUTES = 0
+    BACKUP_RETENTION = 14
+    BACKUP_PAGES_PER_STEP = 1024
+    BACKUP_STEP_SLEEP_SECONDS = 0.01
+    BACKUP_MAX_SECONDS = 600
+
+    # Pagination untuk laporan
+    REPORT_PAGE_SIZE = 50
+    REPORT_MAX_PAGE_SIZE = 500
+
+    # Konfigurasi untuk bulk import/export
+    IMPORT_CHUNK_SIZE = 1000
+    EXPORT_FETCH_SIZE = 1000
+
+    # Konfigurasi untuk connection pool SQLite
+    DB_POOL_SIZE = 8
+    DB_POOL_TIMEOUT_SECONDS = 10
+    DB_POOL_HEALTHCHECK_SECONDS = 30
+
+    # Retry untuk operasi tulis yang gagal karena SQLITE_BUSY (setelah busy_timeout)
+    DB_BUSY_RETRIES = 3
+    DB_BUSY_RETRY_BACKOFF_SECONDS = 0.05
+
+    # Group commit untuk check-in (write-behind). Pemanggil menunggu sampai batch
+    # di-commit; write paling lama tertunda GROUP_COMMIT_MAX_DELAY_MS sebelum commit.
+    GROUP_COMMIT_ENABLED = False
+    GROUP_COMMIT_MAX_DELAY_MS = 5
+    GROUP_COMMIT_MAX_BATCH = 64
+
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 268435456
     }
-    ATTENDANCE_LIMIT_MINUTES = 2
\ No newline at end of file
+    SQLITE_JOURNAL_MODE = 'WAL'
+
+    # Live update laporan lewat Server-Sent Events (/api/events)
+    EVENT_BUFFER_SIZE = 1000
+    EVENT_HEARTBEAT_SECONDS = 15
+    EVENT_RETRY_MS = 3000
+
+    # Jumlah thread pembaca untuk API async (services/async_api.py)
+    ASYNC_READER_THREADS = 8
+
+    # Batas umur (hari) untuk kelompok aging tagihan yang belum dibayar
+    # (services/reconcile.py): 0-30, 31-60, 61-90, lebih dari 90 hari
+    AGING_BUCKET_DAYS = [30, 60, 90]
+
+    @classmethod
+    def update(cls, overrides: Dict[str, Any]) -> None:
+        # Mengganti nilai konfigurasi (dipakai oleh create_app, test dan benchmark)
+        for key, value in overrides.items():
+            if not key.isupper() or not hasattr(cls, key):
+                raise AttributeError(f"Unknown config key: {key}")
+            setattr(cls, key, value)
+
+    @classmethod
+    def from_env(cls, prefix: str = 'FMS_') -> Dict[str, Any]:
+        # Override dari environment variable, mis. FMS_DB_PATH=:memory: atau
+        # FMS_LOG_LEVELS='{"app": "INFO"}'. Tipe mengikuti nilai default-nya.
+        overrides = {}
+        for name, raw in os.environ.items():
+            key = name[len(prefix):]
+            if not name.startswith(prefix) or not key.isupper() or not hasattr(cls, key):
+                continue
+            current = getattr(cls, key)
+            if isinstance(current, bool):
+                value = raw.lower() in ('1', 'true', 'yes', 'on')
+            elif isinstance(current, (int, float)):
+                value = type(current)(raw)
+            elif isinstance(current, (dict, list)):
+                value = json.loads(raw)
+            else:
+                value = raw
+            overrides[key] = value
+        return overrides
+
+
+Config.update(Config.from_env())
@@ -0,0 +1,68 @@
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .config import Config
+
+
+class EventBus:
+    # Event perubahan data (attendance baru, tagihan baru, tagihan lunas) untuk
+    # dikirim ke browser lewat Server-Sent Events. Event terakhir disimpan di ring
+    # buffer, sehingga client yang tersambung ulang (header Last-Event-ID) bisa
+    # melanjutkan tanpa memuat ulang tabel. Bus ini hanya berlaku di satu proses.
+    RESET = 'reset'
+
+    # Ukuran buffer dibaca dari Config.EVENT_BUFFER_SIZE saat publish, sehingga
+    # override lewat create_app() atau FMS_* ikut berlaku
+    def __init__(self):
+        self._events = deque(maxlen=Config.EVENT_BUFFER_SIZE)
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        with self._cond:
+            return self._last_id
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        with self._cond:
+            if self._events.maxlen != Config.EVENT_BUFFER_SIZE:
+                self._events = deque(self._events, maxlen=Config.EVENT_BUFFER_SIZE)
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            self._cond.notify_all()
+            return self._last_id
+
+    def since(self, last_id: int, timeout: float) -> Optional[List[Tuple[int, str, Dict[str, Any]]]]:
+        # Event setelah last_id (menunggu paling lama `timeout` detik jika belum ada).
+        # None berarti event yang diminta sudah keluar dari buffer (atau id berasal
+        # dari proses sebelumnya), sehingga client harus memuat ulang tabelnya.
+        with self._cond:
+            if last_id > self._last_id:
+                return None
+            if self._events and last_id < self._events[0][0] - 1:
+                return None
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+            return [event for event in self._events if event[0] > last_id]
+
+    def stream(self, last_id: Optional[int] = None) -> Iterator[str]:
+        # Generator teks SSE; tanpa last_id hanya event baru yang dikirim
+        if last_id is None:
+            last_id = self.last_id
+        yield f"retry: {Config.EVENT_RETRY_MS}\n\n"
+        while True:
+            events = self.since(last_id, Config.EVENT_HEARTBEAT_SECONDS)
+            if events is None:
+                last_id = self.last_id
+                yield f"id: {last_id}\nevent: {EventBus.RESET}\ndata: {{}}\n\n"
+                continue
+            if not events:
+                # Komentar SSE sebagai heartbeat agar proxy tidak memutus koneksi
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, event_type, data in events:
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+            last_id = events[-1][0]
+
+
+EVENTS = EventBus()
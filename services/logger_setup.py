@@ -1,20 +1,45 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 from .config import Config
 
 class LoggerSetup:
+    # QueueListener yang aktif, satu per logger (dihentikan saat aplikasi keluar)
+    _listeners = {}
+    # Logger yang sudah di-setup: name -> (log_file, level), dipakai oleh reload()
+    _configured = {}
+
+    @staticmethod
+    def _file_handler(log_file):
+        # buat file handler dengan rotasi berdasarkan ukuran atau waktu.
+        path = os.path.join(Config.LOG_PATH, log_file)
+        if Config.LOG_ROTATION == 'time':
+            return logging.handlers.TimedRotatingFileHandler(
+                path, when=Config.LOG_ROTATE_WHEN, backupCount=Config.LOG_BACKUP_COUNT
+            )
+        if Config.LOG_ROTATION == 'size':
+            return logging.handlers.RotatingFileHandler(
+                path, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT
+            )
+        return logging.FileHandler(path)
+
     @staticmethod
-    def setup_logger(name, log_file, level=logging.DEBUG):
+    def setup_logger(name, log_file, level=None):
         # membuat logger baru.
         logger = logging.getLogger(name)
         
         # hanya setup handler jika belum ada.
         if not logger.hasHandlers():
-            # set level logging.
+            LoggerSetup._configured[name] = (log_file, level)
+
+            # set level logging (per logger, dari Config.LOG_LEVELS).
+            if level is None:
+                level = Config.LOG_LEVELS.get(name, Config.LOG_LEVEL)
             logger.setLevel(level)
             
-            # buat file handler untuk menyimpan log ke file.
-            handler = logging.FileHandler(os.path.join(Config.LOG_PATH, log_file))
+            handler = LoggerSetup._file_handler(log_file)
             
             # set format log message
             handler.setFormatter(
@@ -22,8 +47,52 @@ class LoggerSetup:
                 '%(asctime)s [%(levelname)s] %(name)s - %(message)s [%(module)s.%(funcName)s:%(lineno)d]'
                 )
             )
-            # tambahkan handler ke logger
-            logger.addHandler(handler)
+
+            if Config.LOG_ASYNC:
+                # Penulisan ke file dilakukan oleh thread QueueListener, sehingga
+                # request hanya memasukkan record ke queue dan tidak menunggu disk.
+                log_queue = queue.SimpleQueue()
+                listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+                listener.start()
+                LoggerSetup._listeners[name] = listener
+                logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            else:
+                # tambahkan handler ke logger
+                logger.addHandler(handler)
             
         return logger
-        
\ No newline at end of file
+
+    @staticmethod
+    def shutdown():
+        # Menghentikan semua listener dan menulis sisa record di queue ke file
+        for listener in LoggerSetup._listeners.values():
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        LoggerSetup._listeners.clear()
+
+    @staticmethod
+    def reload():
+        # Membuat ulang handler semua logger dengan Config saat ini
+        # (mis. setelah LOG_PATH diubah oleh create_app)
+        LoggerSetup.shutdown()
+        for name, (log_file, level) in list(LoggerSetup._configured.items()):
+            logger = logging.getLogger(name)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            LoggerSetup.setup_logger(name, log_file, level)
+
+    @staticmethod
+    def restart_listeners():
+        # Thread listener tidak ikut ter-fork: worker yang di-fork dari proses
+        # induk (mis. gunicorn --preload) harus menjalankan listener sendiri
+        for listener in LoggerSetup._listeners.values():
+            listener._thread = None
+            listener.start()
+
+
+atexit.register(LoggerSetup.shutdown)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=LoggerSetup.restart_listeners)
@@ -0,0 +1,241 @@
+import functools
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .config import Config
+
+# Batas bucket histogram latency (detik)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    # Counter Prometheus dengan label opsional
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    # Histogram Prometheus (bucket kumulatif, sum dan count) dengan label opsional
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    # Gauge yang nilainya dibaca dari callback setiap kali /metrics diminta.
+    # Callback mengembalikan dict {label_values_tuple: value}.
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], callback: Callable[[], Dict[tuple, float]]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Registry:
+    # Kumpulan metric yang dirender bersama pada endpoint /metrics
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    'fms_http_request_duration_seconds', 'Wall time per HTTP route.', ('route', 'method', 'status')
+))
+model_call_duration = REGISTRY.register(Histogram(
+    'fms_model_call_duration_seconds', 'Wall time per model method call.', ('method',)
+))
+sql_statement_duration = REGISTRY.register(Histogram(
+    'fms_sql_statement_duration_seconds', 'Wall time per SQL statement.', ('statement',)
+))
+sql_rows_fetched = REGISTRY.register(Counter(
+    'fms_sql_rows_fetched_total', 'Rows fetched from SQLite.', ('statement',)
+))
+db_connections_opened = REGISTRY.register(Counter(
+    'fms_db_connections_opened_total', 'Physical SQLite connections opened.'
+))
+group_commit_batch_size = REGISTRY.register(Histogram(
+    'fms_group_commit_batch_size', 'Writes committed together by the group-commit queue.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+))
+db_busy_retries = REGISTRY.register(Counter(
+    'fms_db_busy_retries_total', 'Write transactions retried after SQLITE_BUSY.', ('operation',)
+))
+
+
+# Statistik per request (per thread), dipakai untuk header Server-Timing
+_request = threading.local()
+
+
+def begin_request() -> None:
+    _request.stats = {'db': 0.0, 'db_count': 0, 'model': 0.0, 'started': time.perf_counter()}
+
+
+def end_request() -> Optional[Dict[str, float]]:
+    stats = getattr(_request, 'stats', None)
+    _request.stats = None
+    if stats is not None:
+        stats['total'] = time.perf_counter() - stats['started']
+    return stats
+
+
+def _add_request_time(key: str, elapsed: float) -> None:
+    stats = getattr(_request, 'stats', None)
+    if stats is not None:
+        stats[key] += elapsed
+        if key == 'db':
+            stats['db_count'] += 1
+
+
+# Label statement diambil dari kata kunci pertama dan tabel, mis. "SELECT attendance_log".
+# Hasilnya di-cache per teks SQL agar tidak mem-parsing ulang query yang sama.
+_STATEMENT_PATTERN = re.compile(
+    r'^\s*(\w+)(?:.*?\b(?:FROM|INTO|UPDATE|TABLE|INDEX|ON)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+))?',
+    re.IGNORECASE | re.DOTALL
+)
+_statement_labels: Dict[str, str] = {}
+
+
+_SUBQUERY_PATTERN = re.compile(r'\([^()]*\)')
+
+
+def statement_label(sql: str) -> str:
+    label = _statement_labels.get(sql)
+    if label is None:
+        # Buang subquery/ekspresi dalam kurung agar tabel utama yang terbaca
+        outer = sql
+        while True:
+            stripped = _SUBQUERY_PATTERN.sub(' subquery ', outer)
+            if stripped == outer:
+                break
+            outer = stripped
+        match = _STATEMENT_PATTERN.match(outer)
+        if match:
+            keyword = match.group(1).upper()
+            if keyword == 'UPDATE':
+                table = re.match(r'^\s*UPDATE\s+(\w+)', outer, re.IGNORECASE)
+                label = f"UPDATE {table.group(1)}" if table else keyword
+            else:
+                label = f"{keyword} {match.group(2)}" if match.group(2) else keyword
+        else:
+            label = 'OTHER'
+        if len(_statement_labels) < 1000:
+            _statement_labels[sql] = label
+    return label
+
+
+def observe_statement(sql: str, elapsed: float) -> None:
+    sql_statement_duration.observe(elapsed, statement_label(sql))
+    _add_request_time('db', elapsed)
+
+
+def observe_rows(sql: Optional[str], count: int) -> None:
+    if count:
+        sql_rows_fetched.inc(statement_label(sql) if sql else 'OTHER', amount=count)
+
+
+def timed(name: str):
+    # Decorator untuk mencatat wall time sebuah method model
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Config.METRICS_ENABLED:
+                return func(*args, **kwargs)
+            # Hanya panggilan terluar yang dihitung ke total model per request
+            depth = getattr(_request, 'depth', 0)
+            _request.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                _request.depth = depth
+                model_call_duration.observe(elapsed, name)
+                if depth == 0:
+                    _add_request_time('model', elapsed)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(stats: Dict[str, float]) -> str:
+    # Format header Server-Timing (durasi dalam milidetik)
+    return (
+        f'db;dur={stats["db"] * 1000:.2f};desc="{stats["db_count"]} queries", '
+        f'model;dur={stats["model"] * 1000:.2f}, '
+        f'total;dur={stats["total"] * 1000:.2f}'
+    )
@@ -1,77 +1,1027 @@
+import base64
+import bisect
+import functools
 import inspect
 import os
+import queue
+import random
 import sqlite3
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
-import uuid
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
 from .config import Config
 from .logger_setup import LoggerSetup
+from . import metrics
+from .metrics import timed
+from .events import EVENTS
 
 models_logger = LoggerSetup.setup_logger('models', 'models.log')
 
+
+def is_busy_error(e: sqlite3.Error) -> bool:
+    # SQLITE_BUSY / SQLITE_LOCKED: database sedang dikunci koneksi (atau proses) lain
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(e).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_busy(func):
+    # Decorator untuk operasi tulis: ulangi seluruh transaksi jika SQLite tetap
+    # mengembalikan SQLITE_BUSY setelah busy_timeout habis. Hanya panggilan terluar
+    # yang diulang; panggilan di dalam transaksi lain ikut gagal ke pemanggilnya.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(Database._local, 'conn', None) is not None:
+            return func(*args, **kwargs)
+        delay = Config.DB_BUSY_RETRY_BACKOFF_SECONDS
+        for attempt in range(Config.DB_BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == Config.DB_BUSY_RETRIES or not is_busy_error(e):
+                    raise
+                metrics.db_busy_retries.inc(func.__qualname__)
+                models_logger.warning("Database busy in %s, retrying (%s/%s)", func.__qualname__, attempt + 1, Config.DB_BUSY_RETRIES)
+                time.sleep(delay * (1 + random.random()))
+                delay *= 2
+    return wrapper
+
+# Statement untuk menghitung ulang tabel rollup harian dari attendance_log dan payment_log.
+# Dipakai oleh migrasi yang membuat tabel rollup dan oleh DailyRollup.rebuild().
+ROLLUP_REBUILD_STATEMENTS = [
+    'DELETE FROM daily_attendance',
+    'DELETE FROM daily_revenue',
+    '''
+    INSERT INTO daily_attendance (day, transport, visits)
+    SELECT date(attendance_log.timestamp), members.transport, COUNT(*)
+    FROM attendance_log
+    JOIN members ON attendance_log.member_code = members.member_code
+    GROUP BY 1, 2
+    ''',
+    '''
+    INSERT INTO daily_revenue (day, transport, due, collected)
+    SELECT day, transport, SUM(due), SUM(collected)
+    FROM (
+        SELECT date(payment_log.timestamp) AS day, members.transport, payment_log.payment_due AS due, 0 AS collected
+        FROM payment_log
+        JOIN members ON payment_log.member_code = members.member_code
+        UNION ALL
+        SELECT date(COALESCE(payment_log.paid_at, payment_log.timestamp)), members.transport, 0, payment_log.payment_due
+        FROM payment_log
+        JOIN members ON payment_log.member_code = members.member_code
+        WHERE payment_log.paid = TRUE
+    )
+    GROUP BY day, transport
+    '''
+]
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Cursor yang mencatat durasi setiap statement SQL dan jumlah baris yang diambil
+    def execute(self, sql, parameters=()):
+        self.last_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_statement(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.last_sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_statement(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.observe_rows(getattr(self, 'last_sql', None), 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.observe_rows(getattr(self, 'last_sql', None), len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.observe_rows(getattr(self, 'last_sql', None), len(rows))
+        return rows
+
+
+class PooledConnection(sqlite3.Connection):
+    # Koneksi SQLite yang dikembalikan ke pool saat close(), bukan ditutup sungguhan
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_path = None
+        self.refcount = 0
+        self.last_used = time.monotonic()
+
+    def cursor(self, factory=None):
+        # Pakai TimedCursor jika metrics aktif
+        if factory is None:
+            factory = TimedCursor if Config.METRICS_ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self) -> None:
+        Database.release_connection(self)
+
+    def close_physical(self) -> None:
+        super().close()
+
+
 class Database:
 
     first_connection = True
 
+    # State connection pool (dibagi oleh semua thread)
+    _idle: List[PooledConnection] = []
+    _open_count = 0
+    _pool_path = None
+    _pool_cond = threading.Condition()
+    _local = threading.local()
+    _stats = {'hits': 0, 'misses': 0, 'waits': 0, 'discarded': 0}
+    _inherited: List[sqlite3.Connection] = []
+    _init_lock = threading.Lock()
+    _initialized_path = None
+
+    @staticmethod
+    def _reset_after_fork() -> None:
+        # Dipanggil di proses anak setelah fork (mis. worker gunicorn --preload).
+        # Koneksi SQLite tidak boleh dipakai lintas fork, jadi setiap worker membuat
+        # pool sendiri. Koneksi warisan disimpan tanpa ditutup agar lock milik
+        # proses induk tidak ikut dilepas.
+        Database._inherited.extend(Database._idle)
+        held = getattr(Database._local, 'conn', None)
+        if held is not None:
+            Database._inherited.append(held)
+        if Database._memory_keeper is not None:
+            Database._inherited.append(Database._memory_keeper)
+            Database._memory_keeper = None
+        Database._idle = []
+        Database._open_count = 0
+        Database._pool_path = None
+        Database._initialized_path = None
+        Database._pool_cond = threading.Condition()
+        Database._local = threading.local()
+        Database._stats = {'hits': 0, 'misses': 0, 'waits': 0, 'discarded': 0}
+        Database._init_lock = threading.Lock()
+        Database.first_connection = True
+
+    MEMORY = ':memory:'
+    _memory_keeper = None
+
+    @staticmethod
+    def connect_target() -> Tuple[str, bool]:
+        # Target sqlite3.connect() untuk DB_PATH: (database, uri). DB_PATH ':memory:'
+        # berarti satu database di memori yang dibagi semua koneksi dalam proses ini
+        # (VFS memdb; SQLite lama memakai shared-cache)
+        if Config.DB_PATH != Database.MEMORY:
+            return Config.DB_PATH, False
+        name = f"fms-{os.getpid()}"
+        if sqlite3.sqlite_version_info >= (3, 36, 0):
+            return f"file:/{name}?vfs=memdb", True
+        return f"file:{name}?mode=memory&cache=shared", True
+
+    @staticmethod
+    def _keep_memory_database() -> None:
+        # Database di memori hilang saat koneksi terakhirnya ditutup; satu koneksi
+        # "keeper" di luar pool menjaganya tetap ada selama DB_PATH = ':memory:'
+        if Database._memory_keeper is not None:
+            Database._memory_keeper.close()
+            Database._memory_keeper = None
+        if Config.DB_PATH == Database.MEMORY:
+            database, uri = Database.connect_target()
+            Database._memory_keeper = sqlite3.connect(database, uri=uri, check_same_thread=False)
+
+    @staticmethod
+    def _connect() -> PooledConnection:
+        # Membuka koneksi fisik baru dan menerapkan pragma sekali saja
+        database, uri = Database.connect_target()
+        conn = sqlite3.connect(
+            database,
+            uri=uri,
+            factory=PooledConnection,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        metrics.db_connections_opened.inc()
+        for pragma, value in Config.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        conn.pool_path = Config.DB_PATH
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        # Health check untuk koneksi yang terlalu lama menganggur di pool
+        if time.monotonic() - conn.last_used < Config.DB_POOL_HEALTHCHECK_SECONDS:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn: PooledConnection) -> None:
+        # Menutup koneksi fisik dan mengeluarkannya dari hitungan pool
+        Database._open_count -= 1
+        Database._stats['discarded'] += 1
+        try:
+            conn.close_physical()
+        except sqlite3.Error:
+            pass
+
     @staticmethod
     def get_connection():
-        # Membuat koneksi dengan database SQLite
+        # Mengambil koneksi dari pool. Thread yang sudah memegang koneksi
+        # akan memakai koneksi yang sama (nested call tidak membuka koneksi baru).
+        held = getattr(Database._local, 'conn', None)
+        if held is not None:
+            held.refcount += 1
+            return held
+
+        conn = None
+        with Database._pool_cond:
+            if Database._pool_path != Config.DB_PATH:
+                # DB_PATH berubah, koneksi lama tidak boleh dipakai lagi
+                while Database._idle:
+                    Database._discard(Database._idle.pop())
+                Database._keep_memory_database()
+                Database._pool_path = Config.DB_PATH
+
+            deadline = time.monotonic() + Config.DB_POOL_TIMEOUT_SECONDS
+            while True:
+                if Database._idle:
+                    candidate = Database._idle.pop()
+                    if Database._is_healthy(candidate):
+                        Database._stats['hits'] += 1
+                        conn = candidate
+                        break
+                    Database._discard(candidate)
+                    continue
+
+                if Database._open_count < Config.DB_POOL_SIZE:
+                    Database._open_count += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    models_logger.error("Database connection pool exhausted.")
+                    raise sqlite3.OperationalError('Database connection pool exhausted')
+                Database._stats['waits'] += 1
+                Database._pool_cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = Database._connect()
+            except sqlite3.Error as e:
+                with Database._pool_cond:
+                    Database._open_count -= 1
+                    Database._pool_cond.notify()
+                models_logger.error("Database connection error: %s", e)
+                raise
+
+            with Database._pool_cond:
+                Database._stats['misses'] += 1
+                if Database.first_connection:
+                    models_logger.debug('Database connection established.')
+                    Database.first_connection = False
+
+        conn.refcount = 1
+        Database._local.conn = conn
+        return conn
+
+    @staticmethod
+    def release_connection(conn: PooledConnection) -> None:
+        # Mengembalikan koneksi ke pool ketika pemakai terakhir selesai
+        conn.refcount -= 1
+        if conn.refcount > 0:
+            return
+
+        if getattr(Database._local, 'conn', None) is conn:
+            Database._local.conn = None
+
+        healthy = True
+        if conn.in_transaction:
+            # Transaksi yang tidak di-commit tidak boleh terbawa ke pemakai berikutnya
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                healthy = False
+
+        with Database._pool_cond:
+            if healthy and conn.pool_path == Database._pool_path:
+                conn.last_used = time.monotonic()
+                Database._idle.append(conn)
+            else:
+                Database._discard(conn)
+            Database._pool_cond.notify()
+
+    @staticmethod
+    def close_pool() -> None:
+        # Menutup semua koneksi yang sedang menganggur di pool
+        with Database._pool_cond:
+            while Database._idle:
+                Database._discard(Database._idle.pop())
+
+    @staticmethod
+    def pool_stats() -> Dict[str, int]:
+        # Statistik pool: hit/miss, jumlah koneksi terbuka dan yang menganggur
+        with Database._pool_cond:
+            stats = dict(Database._stats)
+            stats['open'] = Database._open_count
+            stats['idle'] = len(Database._idle)
+            stats['size'] = Config.DB_POOL_SIZE
+        return stats
+
+    # Daftar migrasi skema. Migrasi ke-N dijalankan jika PRAGMA user_version < N,
+    # lalu user_version di-set ke N. Migrasi baru selalu ditambahkan di akhir list.
+    MIGRATIONS = [
+        # 1: skema awal
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS members (
+                member_code TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                transport TEXT NOT NULL,
+                fee INTEGER NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS attendance_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                member_code TEXT NOT NULL,
+                visit_number INTEGER NOT NULL,
+                timestamp DATETIME NOT NULL,
+                FOREIGN KEY (member_code) REFERENCES members (member_code)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS payment_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                member_code TEXT NOT NULL,
+                payment_due INTEGER NOT NULL,
+                paid BOOLEAN DEFAULT FALSE,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (member_code) REFERENCES members (member_code)
+            )
+            '''
+        ],
+        # 2: index untuk query check-in (attendance terakhir dan tagihan yang belum dibayar)
+        [
+            '''
+            CREATE INDEX IF NOT EXISTS idx_attendance_log_member_timestamp
+            ON attendance_log (member_code, timestamp)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_payment_log_unpaid
+            ON payment_log (member_code) WHERE paid = FALSE
+            '''
+        ],
+        # 3: index untuk pagination laporan berdasarkan (timestamp, id)
+        [
+            '''
+            CREATE INDEX IF NOT EXISTS idx_attendance_log_timestamp
+            ON attendance_log (timestamp)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_payment_log_timestamp
+            ON payment_log (timestamp)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_payment_log_member_timestamp
+            ON payment_log (member_code, timestamp)
+            '''
+        ],
+        # 4: tabel rollup harian untuk dashboard, diisi dari data yang sudah ada
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS daily_attendance (
+                day TEXT NOT NULL,
+                transport TEXT NOT NULL,
+                visits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, transport)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS daily_revenue (
+                day TEXT NOT NULL,
+                transport TEXT NOT NULL,
+                due INTEGER NOT NULL DEFAULT 0,
+                collected INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, transport)
+            )
+            ''',
+            'ALTER TABLE payment_log ADD COLUMN paid_at DATETIME'
+        ] + ROLLUP_REBUILD_STATEMENTS,
+        # 5: attendance_log menjadi riwayat append-only (satu baris per kunjungan);
+        # visit_number yang sedang berjalan disimpan di member_visit_state
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS member_visit_state (
+                member_code TEXT PRIMARY KEY,
+                visit_number INTEGER NOT NULL DEFAULT 0,
+                last_visit DATETIME,
+                FOREIGN KEY (member_code) REFERENCES members (member_code)
+            )
+            ''',
+            '''
+            INSERT OR REPLACE INTO member_visit_state (member_code, visit_number, last_visit)
+            SELECT member_code, visit_number, timestamp
+            FROM attendance_log AS latest
+            WHERE latest.id = (
+                SELECT id FROM attendance_log
+                WHERE attendance_log.member_code = latest.member_code
+                ORDER BY timestamp DESC LIMIT 1
+            )
+            '''
+        ],
+        # 6: sequence untuk kode anggota (lihat MemberCode)
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS sequences (
+                name TEXT PRIMARY KEY,
+                next_value INTEGER NOT NULL
+            )
+            ''',
+            "INSERT OR IGNORE INTO sequences (name, next_value) VALUES ('member_code', 1)"
+        ],
+        # 7: tarif berversi per transport (lihat FeeSchedule). Versi 1 memakai tarif
+        # lama (sebelumnya Config.FEES, 5 kunjungan per tagihan) dan ditulis langsung
+        # di sini agar isi migrasi tidak ikut berubah jika konfigurasi berubah.
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS fee_plans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transport TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fee INTEGER NOT NULL,
+                visits_per_payment INTEGER NOT NULL,
+                effective_from DATETIME NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (transport, version)
+            )
+            ''',
+            '''
+            INSERT OR IGNORE INTO fee_plans (transport, version, fee, visits_per_payment, effective_from)
+            VALUES ('BUS', 1, 100000, 5, '1970-01-01 00:00:00'),
+                   ('TRAVEL', 1, 50000, 5, '1970-01-01 00:00:00')
+            '''
+        ]
+    ]
+
+    @staticmethod
+    def encode_cursor(timestamp: str, id: int) -> str:
+        # Membuat cursor pagination dari (timestamp, id) baris terakhir di halaman
+        return base64.urlsafe_b64encode(f"{timestamp}|{id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, int]:
+        # Membaca kembali cursor pagination, ValueError jika cursor tidak valid
+        try:
+            timestamp, id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            return timestamp, int(id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError('Invalid cursor') from e
+
+    @staticmethod
+    def page_filters(table: str, cursor: Optional[str], member_code: Optional[str],
+                     date_from: Optional[str], date_to: Optional[str]) -> Tuple[List[str], List[Any]]:
+        # Menyusun kondisi WHERE untuk keyset pagination dan filter laporan
+        conditions, params = [], []
+        if cursor:
+            timestamp, id = Database.decode_cursor(cursor)
+            conditions.append(f"({table}.timestamp, {table}.id) < (?, ?)")
+            params.extend([timestamp, id])
+        if member_code:
+            conditions.append(f"{table}.member_code = ?")
+            params.append(member_code)
+        if date_from:
+            conditions.append(f"{table}.timestamp >= ?")
+            params.append(date_from)
+        if date_to:
+            # date_to inklusif untuk seluruh hari tersebut
+            conditions.append(f"{table}.timestamp < date(?, '+1 day')")
+            params.append(date_to)
+        return conditions, params
+
+    @staticmethod
+    def schema_version(conn: sqlite3.Connection) -> int:
+        # Membaca versi skema yang tersimpan di database
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    @staticmethod
+    def ensure_initialized() -> None:
+        # Menjalankan init_db sekali per proses untuk DB_PATH yang aktif
+        with Database._init_lock:
+            if Database._initialized_path != Config.DB_PATH:
+                Database.init_db()
+                Database._initialized_path = Config.DB_PATH
+
+    @staticmethod
+    @retry_on_busy
+    def init_db():
+        # Menginisialisasikan database dan menjalankan migrasi yang belum diterapkan
+        conn = Database.get_connection()
         try:
-            conn = sqlite3.connect(Config.DB_PATH)
-            conn.row_factory = sqlite3.Row
-
-            if Database.first_connection:
-                models_logger.debug('Database connection established.')
-                Database.first_connection = False
-                
-            return conn
+            # journal_mode tidak bisa diubah di dalam transaksi
+            mode = conn.execute(f'PRAGMA journal_mode = {Config.SQLITE_JOURNAL_MODE}').fetchone()[0]
+            models_logger.debug("Database journal mode: %s", mode)
+
+            # BEGIN IMMEDIATE agar hanya satu proses yang menjalankan migrasi
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            current = Database.schema_version(conn)
+            target = len(Database.MIGRATIONS)
+
+            for version in range(current + 1, target + 1):
+                for statement in Database.MIGRATIONS[version - 1]:
+                    c.execute(statement)
+                c.execute(f'PRAGMA user_version = {version}')
+                models_logger.info("Applied database migration %s", version)
+
+            conn.commit()
+            if current < target:
+                models_logger.debug("Database initialized succesfully (schema version %s).", target)
         except sqlite3.Error as e:
-            models_logger.error(f"Database connection error: {e}")
+            conn.rollback()
+            models_logger.error("Error initializing database: %s", e)
             raise
+        finally:
+            conn.close()
+
+
+class WriteQueue:
+    # Menjalankan "write job": fungsi job(cursor) -> (hasil, after_commit) yang
+    # menulis tanpa commit sendiri. after_commit (opsional) dijalankan setelah
+    # data tersimpan, mis. untuk memperbarui cache.
+    #
+    # Jika GROUP_COMMIT_ENABLED aktif, job dari semua thread dimasukkan ke queue
+    # dan ditulis oleh satu thread dalam satu transaksi (group commit): flush
+    # setiap GROUP_COMMIT_MAX_DELAY_MS atau setiap GROUP_COMMIT_MAX_BATCH job.
+    # Setiap job berjalan di dalam SAVEPOINT sendiri, sehingga job yang gagal
+    # tidak membatalkan job lain. Pemanggil baru mendapat hasil setelah batch-nya
+    # di-commit.
+    _queue = queue.SimpleQueue()
+    _thread = None
+    _lock = threading.Lock()
 
     @staticmethod
-    def init_db():
-        # Menginisialisasikan database dengan membuat tabel yang diperlukan
-        if os.path.exists(Config.DB_PATH):
-            return
-        
+    def run(job: Callable[[sqlite3.Cursor], Tuple[Any, Optional[Callable[[], None]]]]) -> Any:
+        if Config.GROUP_COMMIT_ENABLED and getattr(Database._local, 'conn', None) is None:
+            return WriteQueue.submit(job)
+
+        # Tanpa group commit: satu transaksi per job (atau ikut transaksi pemanggil)
+        conn = Database.get_connection()
+        own_transaction = not conn.in_transaction
+        try:
+            c = conn.cursor()
+            if own_transaction:
+                c.execute('BEGIN IMMEDIATE')
+            result, after_commit = job(c)
+            if own_transaction:
+                conn.commit()
+        except Exception:
+            if own_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if after_commit:
+            after_commit()
+        return result
+
+    @staticmethod
+    def submit(job: Callable[[sqlite3.Cursor], Tuple[Any, Optional[Callable[[], None]]]]) -> Any:
+        # Memasukkan job ke queue dan menunggu sampai batch-nya di-commit
+        future = Future()
+        WriteQueue._queue.put((job, future))
+        if WriteQueue._thread is None:
+            WriteQueue._start()
+        return future.result()
+
+    @staticmethod
+    def _start() -> None:
+        with WriteQueue._lock:
+            if WriteQueue._thread is None:
+                WriteQueue._thread = threading.Thread(target=WriteQueue._run, name='group-commit', daemon=True)
+                WriteQueue._thread.start()
+
+    @staticmethod
+    def _run() -> None:
+        while True:
+            batch = [WriteQueue._queue.get()]
+            deadline = time.monotonic() + Config.GROUP_COMMIT_MAX_DELAY_MS / 1000
+            while len(batch) < Config.GROUP_COMMIT_MAX_BATCH:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        batch.append(WriteQueue._queue.get(timeout=remaining))
+                    else:
+                        batch.append(WriteQueue._queue.get_nowait())
+                except queue.Empty:
+                    break
+            WriteQueue._flush(batch)
+
+    @staticmethod
+    def _flush(batch: List[tuple]) -> None:
+        # Menulis satu batch dalam satu transaksi, lalu mengabari pemanggil
+        outcomes = []
+        conn = None
         try:
             conn = Database.get_connection()
             c = conn.cursor()
-            c.executescript('''
-                CREATE TABLE IF NOT EXISTS members (
-                    member_code TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    transport TEXT NOT NULL,
-                    fee INTEGER NOT NULL
-                );
-                
-                CREATE TABLE IF NOT EXISTS attendance_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    member_code TEXT NOT NULL,
-                    visit_number INTEGER NOT NULL,
-                    timestamp DATETIME NOT NULL,
-                    FOREIGN KEY (member_code) REFERENCES members (member_code)
-                );
-                
-                CREATE TABLE IF NOT EXISTS payment_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    member_code TEXT NOT NULL,
-                    payment_due INTEGER NOT NULL,
-                    paid BOOLEAN DEFAULT FALSE,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (member_code) REFERENCES members (member_code)
-                );
+            c.execute('BEGIN IMMEDIATE')
+            for job, future in batch:
+                c.execute('SAVEPOINT write_job')
+                try:
+                    outcomes.append((future, job(c), None))
+                    c.execute('RELEASE write_job')
+                except Exception as e:
+                    c.execute('ROLLBACK TO write_job')
+                    c.execute('RELEASE write_job')
+                    outcomes.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            models_logger.error("Group commit of %s writes failed: %s", len(batch), e)
+            for job, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+
+        metrics.group_commit_batch_size.observe(len(batch))
+        for future, outcome, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+                continue
+            result, after_commit = outcome
+            try:
+                if after_commit:
+                    after_commit()
+            except Exception as e:
+                models_logger.error("Error after group commit: %s", e)
+            future.set_result(result)
+
+    @staticmethod
+    def _reset_after_fork() -> None:
+        # Thread penulis tidak ikut ter-fork; job di queue milik proses induk
+        WriteQueue._queue = queue.SimpleQueue()
+        WriteQueue._thread = None
+        WriteQueue._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Database._reset_after_fork)
+    os.register_at_fork(after_in_child=WriteQueue._reset_after_fork)
+
+
+class TTLCache:
+    # Cache LRU dengan TTL per entri dan statistik hit/miss (thread-safe).
+    # Nilai None juga disimpan, sehingga hasil "tidak ditemukan" ikut di-cache.
+    # Ukuran dan TTL dibaca dari Config saat dipakai (nama atributnya disimpan),
+    # sehingga override lewat create_app() atau FMS_* ikut berlaku.
+    MISSING = object()
+
+    def __init__(self, name: str, size_key: str, ttl_key: str):
+        self.name = name
+        self.size_key = size_key
+        self.ttl_key = ttl_key
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        return getattr(Config, self.size_key)
+
+    @property
+    def ttl(self) -> float:
+        return getattr(Config, self.ttl_key)
+
+    def get(self, key):
+        if not Config.CACHE_ENABLED:
+            return TTLCache.MISSING
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return TTLCache.MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        if not Config.CACHE_ENABLED:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        maxsize = self.maxsize
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class MemberCode:
+    # Kode anggota baru: "MEM-" + nomor urut (minimal 7 digit) + 1 digit cek Luhn,
+    # mis. MEM-00000018. Nomor diambil dari tabel sequences di dalam transaksi yang
+    # sama dengan INSERT, sehingga selalu unik tanpa perlu mencoba ulang.
+    # Kode lama (MEM- + 6 karakter hex) tetap valid.
+    PREFIX = 'MEM-'
+    DIGITS = 7
+    LEGACY_CHARS = frozenset('0123456789ABCDEF')
+
+    @staticmethod
+    def check_digit(digits: str) -> int:
+        # Digit cek Luhn untuk string digit
+        total = 0
+        for position, char in enumerate(reversed(digits)):
+            value = ord(char) - 48
+            if position % 2 == 0:
+                value *= 2
+                if value > 9:
+                    value -= 9
+            total += value
+        return (10 - total % 10) % 10
+
+    @staticmethod
+    def format(number: int) -> str:
+        digits = str(number).zfill(MemberCode.DIGITS)
+        return f"{MemberCode.PREFIX}{digits}{MemberCode.check_digit(digits)}"
+
+    @staticmethod
+    def is_valid(code: Optional[str]) -> bool:
+        # Validasi format tanpa query database (kode salah scan langsung ditolak)
+        if not isinstance(code, str) or not code.startswith(MemberCode.PREFIX):
+            return False
+        body = code[len(MemberCode.PREFIX):]
+        if len(body) == 6:
+            return all(char in MemberCode.LEGACY_CHARS for char in body)
+        if len(body) <= MemberCode.DIGITS or not body.isascii() or not body.isdigit():
+            return False
+        return MemberCode.check_digit(body[:-1]) == int(body[-1])
+
+    @staticmethod
+    def allocate(c: sqlite3.Cursor, count: int) -> List[str]:
+        # Mengambil satu blok nomor urut (count kode) dengan satu UPDATE ... RETURNING.
+        # Harus dipanggil di dalam transaksi tulis yang juga menyimpan anggotanya.
+        c.execute(
+            "UPDATE sequences SET next_value = next_value + ? WHERE name = 'member_code' RETURNING next_value",
+            (count,)
+        )
+        end = c.fetchone()[0]
+        return [MemberCode.format(number) for number in range(end - count, end)]
+
+
+class FeePlan:
+    # Satu versi tarif untuk satu transport: fee per kunjungan dan jumlah kunjungan
+    # per tagihan, berlaku mulai effective_from sampai versi berikutnya berlaku
+    __slots__ = ('id', 'transport', 'version', 'fee', 'visits_per_payment', 'effective_from')
+
+    def __init__(self, id: int, transport: str, version: int, fee: int, visits_per_payment: int, effective_from: str):
+        self.id = id
+        self.transport = transport
+        self.version = version
+        self.fee = fee
+        self.visits_per_payment = visits_per_payment
+        self.effective_from = effective_from
+
+    @property
+    def payment_amount(self) -> int:
+        return self.fee * self.visits_per_payment
+
+
+class FeeSchedule:
+    # Tarif dari tabel fee_plans. Semua plan (tabelnya kecil) dimuat ke memori,
+    # dan plan yang berlaku untuk setiap anggota di-cache per member_code beserta
+    # batas waktu berlakunya, sehingga check-in tidak perlu query tambahan.
+    # Menambah plan mengosongkan kedua cache; proses lain melihat plan baru
+    # paling lambat setelah PRICING_CACHE_TTL_SECONDS.
+    cache = TTLCache('pricing', 'PRICING_CACHE_SIZE', 'PRICING_CACHE_TTL_SECONDS')
+    # transport -> (daftar effective_from, daftar FeePlan), keduanya terurut
+    _plans: Optional[Dict[str, Tuple[List[str], List[FeePlan]]]] = None
+    _loaded_at = 0.0
+    # Naik setiap invalidate(), agar hasil load yang dimulai sebelumnya tidak disimpan
+    _generation = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def load(c: sqlite3.Cursor) -> Dict[str, Tuple[List[str], List[FeePlan]]]:
+        # Membaca semua versi plan, dikelompokkan per transport
+        c.execute('''
+            SELECT id, transport, version, fee, visits_per_payment, effective_from
+            FROM fee_plans ORDER BY transport, effective_from, version
+        ''')
+        plans = {}
+        for row in c.fetchall():
+            plan = FeePlan(*row)
+            starts, versions = plans.setdefault(plan.transport, ([], []))
+            if starts and starts[-1] == plan.effective_from:
+                # Versi yang lebih baru dengan tanggal berlaku sama menggantikan yang lama
+                versions[-1] = plan
+                continue
+            starts.append(plan.effective_from)
+            versions.append(plan)
+        return plans
+
+    @staticmethod
+    def plans() -> Dict[str, Tuple[List[str], List[FeePlan]]]:
+        # Plan di memori, dimuat ulang setelah TTL agar plan dari proses lain terlihat.
+        # Query dijalankan di luar _lock: pemanggil check-in sudah memegang koneksi
+        # pool, sehingga menunggu koneksi baru sambil memegang lock bisa membuat
+        # semua thread saling menunggu saat pool habis. Lock hanya dipakai untuk
+        # menukar hasil load.
+        with FeeSchedule._lock:
+            if (FeeSchedule._plans is not None and Config.CACHE_ENABLED
+                    and time.monotonic() - FeeSchedule._loaded_at <= Config.PRICING_CACHE_TTL_SECONDS):
+                return FeeSchedule._plans
+            generation = FeeSchedule._generation
+
+        conn = Database.get_connection()
+        try:
+            plans = FeeSchedule.load(conn.cursor())
+        except sqlite3.Error as e:
+            models_logger.error("Error loading fee plans: %s", e)
+            raise
+        finally:
+            conn.close()
+
+        with FeeSchedule._lock:
+            if generation == FeeSchedule._generation:
+                if FeeSchedule._plans is not None and FeeSchedule._ids(plans) != FeeSchedule._ids(FeeSchedule._plans):
+                    FeeSchedule.cache.clear()
+                FeeSchedule._plans = plans
+                FeeSchedule._loaded_at = time.monotonic()
+        return plans
+
+    @staticmethod
+    def _ids(plans: Dict[str, Tuple[List[str], List[FeePlan]]]) -> List[int]:
+        return sorted(plan.id for _, versions in plans.values() for plan in versions)
+
+    @staticmethod
+    def invalidate() -> None:
+        # Dipanggil setelah plan berubah: plan dimuat ulang dan harga per anggota dihitung ulang
+        with FeeSchedule._lock:
+            FeeSchedule._plans = None
+            FeeSchedule._generation += 1
+        FeeSchedule.cache.clear()
+
+    @staticmethod
+    def _resolve(transport: str, at: str) -> Tuple[Optional[FeePlan], Optional[str]]:
+        # Plan yang berlaku pada waktu `at` dan waktu plan berikutnya mulai berlaku
+        starts, versions = FeeSchedule.plans().get(transport, ([], []))
+        index = bisect.bisect_right(starts, at) - 1
+        if index < 0:
+            return None, starts[0] if starts else None
+        return versions[index], starts[index + 1] if index + 1 < len(starts) else None
+
+    @staticmethod
+    def plan_at(transport: str, at: Optional[datetime] = None) -> Optional[FeePlan]:
+        at = (at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        return FeeSchedule._resolve(transport, at)[0]
+
+    @staticmethod
+    def current_plans() -> List[FeePlan]:
+        # Plan yang berlaku sekarang, satu per transport
+        now = datetime.now()
+        plans = (FeeSchedule.plan_at(transport, now) for transport in FeeSchedule.plans())
+        return [plan for plan in plans if plan is not None]
+
+    @staticmethod
+    def transports() -> List[str]:
+        # Transport yang bisa dipilih saat registrasi
+        return [plan.transport for plan in FeeSchedule.current_plans()]
+
+    @staticmethod
+    def pricing(member_code: str, transport: str, at: Optional[datetime] = None) -> FeePlan:
+        # Plan untuk tagihan anggota pada waktu `at`. Entri cache berisi
+        # (plan, waktu plan berikutnya berlaku), sehingga perubahan tarif yang
+        # dijadwalkan langsung berlaku tanpa menunggu TTL.
+        at = (at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        cached = FeeSchedule.cache.get(member_code)
+        if cached is not TTLCache.MISSING:
+            plan, until = cached
+            if plan.transport == transport and plan.effective_from <= at and (until is None or at < until):
+                return plan
+
+        plan, until = FeeSchedule._resolve(transport, at)
+        if plan is None:
+            raise ValueError(f"No fee plan for transport type: {transport}")
+        FeeSchedule.cache.set(member_code, (plan, until))
+        return plan
+
+    @staticmethod
+    def list_plans(include_history: bool = False) -> List[FeePlan]:
+        # Plan yang berlaku sekarang, atau semua versi (termasuk yang dijadwalkan)
+        if not include_history:
+            return FeeSchedule.current_plans()
+        conn = Database.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute('''
+                SELECT id, transport, version, fee, visits_per_payment, effective_from
+                FROM fee_plans ORDER BY transport, version
             ''')
+            return [FeePlan(*row) for row in c.fetchall()]
+        except sqlite3.Error as e:
+            models_logger.error("Error retrieving fee plans: %s", e)
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    @timed('FeeSchedule.add_plan')
+    @retry_on_busy
+    def add_plan(transport: str, fee: int, visits_per_payment: int, effective_from: Optional[datetime] = None) -> FeePlan:
+        # Menambah versi baru untuk transport (transport baru juga boleh).
+        # Tanpa effective_from, plan langsung berlaku.
+        transport = (transport or '').strip().upper()
+        if not transport:
+            raise ValueError('Missing transport type')
+        if fee < 0:
+            raise ValueError('fee must not be negative')
+        if visits_per_payment < 1:
+            raise ValueError('visits_per_payment must be a positive number')
+        effective = (effective_from or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+
+        conn = Database.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            c.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM fee_plans WHERE transport = ?', (transport,))
+            version = c.fetchone()[0]
+            c.execute('''
+                INSERT INTO fee_plans (transport, version, fee, visits_per_payment, effective_from)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (transport, version, fee, visits_per_payment, effective))
+            plan = FeePlan(c.lastrowid, transport, version, fee, visits_per_payment, effective)
             conn.commit()
-            models_logger.debug("Database initialized succesfully.")
+            FeeSchedule.invalidate()
+            models_logger.info("Fee plan %s v%s added: fee %s per visit, %s visits per payment, effective %s",
+                               transport, version, fee, visits_per_payment, effective)
+            return plan
         except sqlite3.Error as e:
-            models_logger.error(f"Error initializing database: {e}")
+            conn.rollback()
+            models_logger.error("Error adding fee plan for %s: %s", transport, e)
+            raise
         finally:
             conn.close()
 
+    @staticmethod
+    def _reset_after_fork() -> None:
+        FeeSchedule._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=FeeSchedule._reset_after_fork)
+
 
 class Member:
+    __slots__ = ('member_code', 'name', 'transport', 'fee')
+
+    # Cache objek Member per kode anggota (termasuk cache negatif untuk kode yang tidak ada)
+    cache = TTLCache('members', 'MEMBER_CACHE_SIZE', 'MEMBER_CACHE_TTL_SECONDS')
+
     def __init__(self, member_code: str, name: str, transport: str, fee: int):
         # Insisalisasi objek Member
         self.member_code = member_code
@@ -80,55 +1030,170 @@ class Member:
         self.fee = fee
 
     @staticmethod
+    def fee_for(transport: str) -> int:
+        # Fee per kunjungan yang dicatat di members.fee saat registrasi. Tagihan
+        # selalu memakai plan yang berlaku saat check-in (FeeSchedule.pricing).
+        plan = FeeSchedule.plan_at(transport)
+        if plan is None:
+            raise ValueError(f"Invalid transport type: {transport}")
+        return plan.fee
+
+    @staticmethod
+    @timed('Member.create')
+    @retry_on_busy
     def create(name: str, transport: str) -> 'Member':
         # Membuat anggota baru dan menyimpannya ke database
         try:
             conn = Database.get_connection()
             c = conn.cursor()
-            member_code = f"MEM-{uuid.uuid4().hex[:6].upper()}" # Digunakan untuk menghasilkan kode anggota unik
-            fee = Config.FEES[transport]
+            fee = Member.fee_for(transport)
+            member_code = MemberCode.allocate(c, 1)[0]
             c.execute('''
                 INSERT INTO members (member_code, name, transport, fee)
                 VALUES (?, ?, ?, ?)
             ''', (member_code, name, transport, fee))
             conn.commit()
-            models_logger.info(f"New member created: {name} with member code: {member_code}")
+            Member.cache.invalidate(member_code)
+            models_logger.info("New member created: %s with member code: %s", name, member_code)
             return Member(member_code, name, transport, fee)
         except sqlite3.Error as e:
-            models_logger.error(f"Error creating member: {e}")
+            models_logger.error("Error creating member: %s", e)
             raise
         finally:
             conn.close()
     
 
     @staticmethod
+    @timed('Member.create_many')
+    @retry_on_busy
+    def create_many(members: List[tuple]) -> List['Member']:
+        # Membuat banyak anggota sekaligus dalam satu transaksi (dipakai oleh bulk import).
+        # members berisi tuple (name, transport) yang sudah divalidasi.
+        conn = Database.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+
+            # Satu blok kode untuk seluruh batch
+            codes = MemberCode.allocate(c, len(members))
+
+            created = [
+                Member(code, name, transport, Member.fee_for(transport))
+                for code, (name, transport) in zip(codes, members)
+            ]
+            c.executemany('''
+                INSERT INTO members (member_code, name, transport, fee)
+                VALUES (?, ?, ?, ?)
+            ''', [(m.member_code, m.name, m.transport, m.fee) for m in created])
+            conn.commit()
+            for member in created:
+                Member.cache.invalidate(member.member_code)
+            models_logger.info("Bulk created %s members", len(created))
+            return created
+        except sqlite3.Error as e:
+            conn.rollback()
+            models_logger.error("Error bulk creating members: %s", e)
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    @timed('Member.get_by_code')
     def get_by_code(member_code: str) -> Optional['Member']:
         # Mendapatkan informasi anggota menggunakan kode anggota.
+        if not MemberCode.is_valid(member_code):
+            return None
+        cached = Member.cache.get(member_code)
+        if cached is not TTLCache.MISSING:
+            return cached
+
         try:
             conn = Database.get_connection()
             c = conn.cursor()
             c.execute('SELECT * FROM members WHERE member_code = ?', (member_code,))
             row = c.fetchone()
             if row:
-                models_logger.info(f"Member found: {row['name']} with member code: {member_code}")
-                return Member(
+                models_logger.info("Member found: %s with member code: %s", row['name'], member_code)
+                member = Member(
                     row['member_code'],
                     row['name'],
                     row['transport'],
                     row['fee']
                 )
+                Member.cache.set(member_code, member)
+                return member
             else:
-                models_logger.warning(f"Member not found for code: {member_code}")
+                models_logger.warning("Member not found for code: %s", member_code)
+                Member.cache.set(member_code, None, ttl=Config.NEGATIVE_CACHE_TTL_SECONDS)
                 return None
         except sqlite3.Error as e:
-            models_logger.error(f"Error retrieving member by code {member_code}: {e}")
+            models_logger.error("Error retrieving member by code %s: %s", member_code, e)
             raise
         finally:
             conn.close()
             
 
 
+class CheckInResult:
+    # Hasil dari satu proses check-in (kehadiran + tagihan opsional)
+    RECORDED = 'recorded'
+    INVALID_MEMBER = 'invalid_member'
+    PAYMENT_REQUIRED = 'payment_required'
+
+    __slots__ = ('status', 'member', 'visit_number', 'payment_amount')
+
+    def __init__(self, status: str, member: Optional[Member] = None, visit_number: int = 0, payment_amount: int = 0):
+        self.status = status
+        self.member = member
+        self.visit_number = visit_number
+        self.payment_amount = payment_amount
+
+    @property
+    def need_payment(self) -> bool:
+        return self.payment_amount > 0
+
+
 class AttendanceLog:
+    __slots__ = ('id', 'member_code', 'timestamp', 'visit_number')
+
+    # Key untuk baris laporan kehadiran (sesuai urutan kolom _report_query).
+    # Baris laporan dibaca sebagai namedtuple Row, jauh lebih kecil dari dict per baris.
+    REPORT_KEYS = ('id', 'memberCode', 'member', 'visitNumber', 'timestamp')
+    Row = namedtuple('AttendanceRow', REPORT_KEYS)
+
+    # Query untuk membaca anggota, status tagihan dan attendance terakhir sekaligus
+    CHECK_IN_STATE_QUERY = '''
+        SELECT
+            members.member_code,
+            members.name,
+            members.transport,
+            members.fee,
+            EXISTS (
+                SELECT 1 FROM payment_log
+                WHERE payment_log.member_code = members.member_code AND paid = FALSE
+            ) AS unpaid,
+            COALESCE(member_visit_state.visit_number, 0) AS visit_number,
+            member_visit_state.last_visit
+        FROM members
+        LEFT JOIN member_visit_state ON member_visit_state.member_code = members.member_code
+        WHERE members.member_code IN ({placeholders})
+    '''
+
+    # Menambah satu kunjungan ke riwayat (tanpa membaca baris sebelumnya)
+    INSERT_EVENT = '''
+        INSERT INTO attendance_log (member_code, timestamp, visit_number)
+        VALUES (?, ?, ?)
+    '''
+
+    # Menyimpan visit_number yang sedang berjalan untuk anggota
+    UPSERT_STATE = '''
+        INSERT INTO member_visit_state (member_code, visit_number, last_visit)
+        VALUES (?, ?, ?)
+        ON CONFLICT (member_code) DO UPDATE SET
+            visit_number = excluded.visit_number,
+            last_visit = excluded.last_visit
+    '''
+
     # Inisialisasi objek Catatan Kehadiran
     def __init__(self, member_code: str, timestamp: datetime, visit_number: int, id: Optional[int] = None):
         self.id = id
@@ -137,30 +1202,44 @@ class AttendanceLog:
         self.visit_number = visit_number
 
     @staticmethod
-    def get_last_attendance(member_code: str, supress_logs: bool = False) -> Optional['AttendanceLog']:
+    @timed('AttendanceLog.get_last_attendance')
+    def get_last_attendance(member_code: str, supress_logs: bool = False, use_cache: bool = True) -> Optional['AttendanceLog']:
         # Digunakan untuk mendapatkan catatan kehadiran terakhir anggota tertentu
+        if use_cache:
+            attendance = BillingState.get(member_code).attendance
+            if attendance and not supress_logs:
+                models_logger.info("Attendance found for member code: %s", member_code)
+            return attendance
+
         try:
             conn = Database.get_connection()
             c = conn.cursor()
             c.execute('''
-                SELECT * FROM attendance_log 
-                WHERE member_code = ? 
-                ORDER BY timestamp DESC LIMIT 1
+                SELECT
+                    member_visit_state.visit_number,
+                    member_visit_state.last_visit,
+                    (
+                        SELECT id FROM attendance_log
+                        WHERE attendance_log.member_code = member_visit_state.member_code
+                        ORDER BY timestamp DESC LIMIT 1
+                    ) AS attendance_id
+                FROM member_visit_state
+                WHERE member_code = ?
             ''', (member_code,))
             row = c.fetchone()
             if row:
                 if not supress_logs:
-                    models_logger.info(f"Attendance found for member code: {member_code}")
+                    models_logger.info("Attendance found for member code: %s", member_code)
                 return AttendanceLog(
-                    row['member_code'],
-                    datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S'),
+                    member_code,
+                    datetime.fromisoformat(row['last_visit']),
                     row['visit_number'],
-                    row['id']
+                    row['attendance_id']
                 )
             return None
         
         except sqlite3.Error as e:
-            models_logger.error(f"Error retrieving attendance for code {member_code}: {e}")
+            models_logger.error("Error retrieving attendance for code %s: %s", member_code, e)
             raise
         finally:
             conn.close()
@@ -168,86 +1247,339 @@ class AttendanceLog:
 
     @staticmethod
     # Membuat catatan kehadiran baru
+    @timed('AttendanceLog.create')
+    @retry_on_busy
     def create(member_code: str, visit_number: int) -> 'AttendanceLog':
+        # Riwayat bersifat append-only: satu INSERT per kunjungan, tanpa SELECT sebelumnya
+        now = datetime.now().replace(microsecond=0)
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+
+        def job(c):
+            c.execute(AttendanceLog.INSERT_EVENT, (member_code, timestamp, visit_number))
+            attendance = AttendanceLog(member_code, now, visit_number, c.lastrowid)
+            c.execute(AttendanceLog.UPSERT_STATE, (member_code, visit_number, timestamp))
+            DailyRollup.add_member_visit(c, member_code, now.strftime('%Y-%m-%d'))
+            return attendance, lambda: AttendanceLog._after_create(attendance)
+
+        try:
+            attendance = WriteQueue.run(job)
+            models_logger.info("Attendance recorded for member code: %s with visit number: %s", member_code, visit_number)
+            return attendance
+        except sqlite3.Error as e:
+            models_logger.error("Error creating attendance for %s: %s", member_code, e)
+            raise
+
+    @staticmethod
+    def _after_create(attendance: 'AttendanceLog') -> None:
+        # Setelah commit: invalidate cache dan kirim attendance baru ke client SSE (/api/events)
+        BillingState.invalidate(attendance.member_code)
+        member = Member.get_by_code(attendance.member_code)
+        EVENTS.publish('attendance', AttendanceLog.Row(
+            attendance.id, attendance.member_code, member.name if member else None,
+            attendance.visit_number, attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        )._asdict())
+
+    @staticmethod
+    @timed('AttendanceLog.check_in')
+    @retry_on_busy
+    def check_in(member_code: str) -> CheckInResult:
+        # Mencatat kehadiran dalam satu transaksi BEGIN IMMEDIATE:
+        # satu query untuk membaca anggota, status tagihan dan visit_number,
+        # lalu menulis attendance dan (jika perlu) payment. Karena write lock
+        # diambil sebelum membaca, dua check-in bersamaan tidak bisa membaca
+        # visit_number yang sama.
+        # Kode dengan format salah, atau yang ada di negative cache, langsung ditolak
+        # (Member.create dan import meng-invalidate cache untuk kode baru). Tagihan
+        # di cache dikonfirmasi dulu dengan satu query baca (tanpa write lock),
+        # karena anggota bisa saja sudah membayar lewat worker lain.
+        if not MemberCode.is_valid(member_code):
+            return CheckInResult(CheckInResult.INVALID_MEMBER)
+        if Member.cache.get(member_code) is None:
+            return CheckInResult(CheckInResult.INVALID_MEMBER)
+        cached_state = BillingState.cache.get(member_code)
+        if cached_state is not TTLCache.MISSING and cached_state.unpaid:
+            rejected = AttendanceLog._rejected(member_code)
+            if rejected is not None:
+                return rejected
+
+        now_dt = datetime.now().replace(microsecond=0)
+        try:
+            return WriteQueue.run(lambda c: AttendanceLog._check_in_job(c, member_code, now_dt))
+        except sqlite3.Error as e:
+            models_logger.error("Error during check-in for %s: %s", member_code, e)
+            raise
+
+    @staticmethod
+    def _rejected(member_code: str) -> Optional[CheckInResult]:
+        # Membaca state check-in dari database (bukan cache), untuk anggota yang
+        # menurut cache masih punya tagihan. Mengembalikan hasil penolakan jika
+        # anggota tidak ada atau tagihannya belum dibayar, None jika boleh check-in.
+        # Cache diperbarui dengan hasilnya.
         try:
-            now = datetime.now()
             conn = Database.get_connection()
             c = conn.cursor()
-            
-            last_attendance = AttendanceLog.get_last_attendance(member_code, supress_logs=True)
-            
-            if last_attendance:
-                c.execute('''
-                    UPDATE attendance_log 
-                    SET timestamp = ?, visit_number = ?
-                    WHERE id = ?
-                ''', (now.strftime('%Y-%m-%d %H:%M:%S'), visit_number, last_attendance.id))
-                models_logger.info(f"Attendance updated for member code: {member_code} with visit number: {visit_number}")
-            else:
-                c.execute('''
-                    INSERT INTO attendance_log (member_code, timestamp, visit_number)
-                    VALUES (?, ?, ?)
-                ''', (member_code, now.strftime('%Y-%m-%d %H:%M:%S'), visit_number))
-                models_logger.info(f"New attendance created for member code: {member_code}")
-            
+            c.execute(AttendanceLog.CHECK_IN_STATE_QUERY.format(placeholders='?'), (member_code,))
+            row = c.fetchone()
+        except sqlite3.Error as e:
+            models_logger.error("Error reading check-in state for %s: %s", member_code, e)
+            raise
+        finally:
+            conn.close()
+
+        BillingState.invalidate(member_code)
+        if not row:
+            Member.cache.set(member_code, None, ttl=Config.NEGATIVE_CACHE_TTL_SECONDS)
+            return CheckInResult(CheckInResult.INVALID_MEMBER)
+        member = Member(row['member_code'], row['name'], row['transport'], row['fee'])
+        Member.cache.set(member_code, member)
+        if row['unpaid']:
+            return CheckInResult(CheckInResult.PAYMENT_REQUIRED, member)
+        return None
+
+    @staticmethod
+    def _completes_cycle(transport: str, visit_number: int, plan: FeePlan, last_visit: Optional[str]) -> bool:
+        # Kunjungan ini ditagih jika jumlah kunjungan sudah mencapai siklus plan,
+        # sedangkan kunjungan sebelumnya masih di bawah siklus plan yang berlaku
+        # saat itu. Kunjungan setelah batas siklus tidak pernah ditagih lagi, dan
+        # siklus yang diperpendek tetap ditagih tepat satu kali.
+        if visit_number < plan.visits_per_payment:
+            return False
+        previous = FeeSchedule.plan_at(transport, datetime.fromisoformat(last_visit)) if last_visit else None
+        return visit_number - 1 < (previous or plan).visits_per_payment
+
+    @staticmethod
+    def _check_in_job(c: sqlite3.Cursor, member_code: str, now_dt: datetime) -> Tuple[CheckInResult, Callable[[], None]]:
+        # Isi transaksi check_in (dipanggil lewat WriteQueue, setelah write lock diambil)
+        now = now_dt.strftime('%Y-%m-%d %H:%M:%S')
+        c.execute(AttendanceLog.CHECK_IN_STATE_QUERY.format(placeholders='?'), (member_code,))
+        row = c.fetchone()
+
+        if not row:
+            models_logger.warning("Member not found for code: %s", member_code)
+            return CheckInResult(CheckInResult.INVALID_MEMBER), \
+                lambda: Member.cache.set(member_code, None, ttl=Config.NEGATIVE_CACHE_TTL_SECONDS)
+
+        member = Member(row['member_code'], row['name'], row['transport'], row['fee'])
+        if row['unpaid']:
+            models_logger.info("Check-in rejected, unpaid payment for member code: %s", member_code)
+
+            def reload_state():
+                # Muat ulang state ke cache agar percobaan berikutnya ditolak tanpa transaksi
+                Member.cache.set(member_code, member)
+                BillingState.invalidate(member_code)
+                BillingState.get(member_code)
+            return CheckInResult(CheckInResult.PAYMENT_REQUIRED, member), reload_state
+
+        visit_number = row['visit_number'] + 1
+        c.execute(AttendanceLog.INSERT_EVENT, (member_code, now, visit_number))
+        attendance_id = c.lastrowid
+        c.execute(AttendanceLog.UPSERT_STATE, (member_code, visit_number, now))
+
+        # Tagihan baru setelah visits_per_payment kunjungan, menurut plan yang berlaku
+        # untuk anggota ini (dari cache FeeSchedule)
+        payment_amount = 0
+        unpaid = None
+        plan = FeeSchedule.pricing(member_code, member.transport, now_dt)
+        if AttendanceLog._completes_cycle(member.transport, visit_number, plan, row['last_visit']):
+            payment_amount = plan.payment_amount
+            c.execute('''
+                INSERT INTO payment_log (member_code, payment_due, paid, timestamp)
+                VALUES (?, ?, FALSE, ?)
+            ''', (member_code, payment_amount, now))
+            unpaid = PaymentLog(member_code, payment_amount, now, False, c.lastrowid)
+
+        day = now[:10]
+        DailyRollup.add_visits(c, [(day, member.transport, 1)])
+        if payment_amount:
+            DailyRollup.add_revenue(c, [(day, member.transport, payment_amount, 0)])
+
+        def write_through():
+            # Simpan state terbaru langsung ke cache (write-through)
+            Member.cache.set(member_code, member)
+            BillingState.cache.set(member_code, BillingState(
+                AttendanceLog(member_code, now_dt, visit_number, attendance_id), unpaid
+            ))
+            models_logger.info("Check-in recorded for member code: %s with visit number: %s", member_code, visit_number)
+            EVENTS.publish('attendance', AttendanceLog.Row(attendance_id, member_code, member.name, visit_number, now)._asdict())
+            if unpaid:
+                EVENTS.publish('payment_due', PaymentLog.Row(unpaid.id, member_code, member.name, payment_amount, False, now)._asdict())
+        return CheckInResult(CheckInResult.RECORDED, member, visit_number, payment_amount), write_through
+
+    @staticmethod
+    @timed('AttendanceLog.check_in_batch')
+    @retry_on_busy
+    def check_in_batch(events: List[tuple]) -> List[CheckInResult]:
+        # Mencatat banyak kehadiran sekaligus (replay dari kiosk offline) dalam satu
+        # transaksi. events berisi tuple (member_code, timestamp) dan hasilnya
+        # dikembalikan dengan urutan yang sama. Event diproses berurutan menurut
+        # timestamp sehingga aturan tagihan per anggota tetap sama seperti check_in.
+        conn = Database.get_connection()
+        try:
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+
+            # Baca state semua anggota yang terlibat, per potongan agar tidak
+            # melewati batas jumlah parameter SQLite
+            states = {}
+            codes = list({code for code, _ in events if MemberCode.is_valid(code)})
+            for start in range(0, len(codes), Config.BATCH_CHUNK_SIZE):
+                chunk = codes[start:start + Config.BATCH_CHUNK_SIZE]
+                c.execute(
+                    AttendanceLog.CHECK_IN_STATE_QUERY.format(placeholders=', '.join('?' * len(chunk))),
+                    chunk
+                )
+                for row in c.fetchall():
+                    states[row['member_code']] = {
+                        'member': Member(row['member_code'], row['name'], row['transport'], row['fee']),
+                        'unpaid': bool(row['unpaid']),
+                        'visit_number': row['visit_number'],
+                        'last_visit': row['last_visit'],
+                        'timestamp': None
+                    }
+
+            results = [None] * len(events)
+            attendance = []
+            payments = []
+            order = sorted(range(len(events)), key=lambda i: events[i][1])
+            for index in order:
+                code, timestamp = events[index]
+                state = states.get(code) if isinstance(code, str) else None
+                if state is None:
+                    results[index] = CheckInResult(CheckInResult.INVALID_MEMBER)
+                    continue
+                if state['unpaid']:
+                    results[index] = CheckInResult(CheckInResult.PAYMENT_REQUIRED, state['member'])
+                    continue
+
+                state['visit_number'] += 1
+                state['timestamp'] = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+                attendance.append((code, state['timestamp'], state['visit_number']))
+                payment_amount = 0
+                plan = FeeSchedule.pricing(code, state['member'].transport, timestamp)
+                if AttendanceLog._completes_cycle(state['member'].transport, state['visit_number'], plan, state['last_visit']):
+                    payment_amount = plan.payment_amount
+                    payments.append((code, payment_amount, state['timestamp']))
+                    state['unpaid'] = True
+                state['last_visit'] = state['timestamp']
+                results[index] = CheckInResult(
+                    CheckInResult.RECORDED, state['member'], state['visit_number'], payment_amount
+                )
+
+            # Tulis semua kunjungan ke riwayat, state akhir per anggota, lalu semua tagihan baru
+            c.executemany(AttendanceLog.INSERT_EVENT, attendance)
+            c.executemany(AttendanceLog.UPSERT_STATE, [
+                (code, state['visit_number'], state['timestamp'])
+                for code, state in states.items()
+                if state['timestamp']
+            ])
+            c.executemany('''
+                INSERT INTO payment_log (member_code, payment_due, paid, timestamp)
+                VALUES (?, ?, FALSE, ?)
+            ''', payments)
+
+            # Rollup harian dijumlahkan dulu di Python, lalu ditulis sekali per (hari, transport)
+            visits, dues = {}, {}
+            for index, result in enumerate(results):
+                if result.status != CheckInResult.RECORDED:
+                    continue
+                key = (events[index][1].strftime('%Y-%m-%d'), result.member.transport)
+                visits[key] = visits.get(key, 0) + 1
+                if result.payment_amount:
+                    dues[key] = dues.get(key, 0) + result.payment_amount
+            DailyRollup.add_visits(c, [(day, transport, count) for (day, transport), count in visits.items()])
+            DailyRollup.add_revenue(c, [(day, transport, due, 0) for (day, transport), due in dues.items()])
+
             conn.commit()
-            return AttendanceLog(member_code, now, visit_number)
+            for code in codes:
+                BillingState.invalidate(code)
+            # Kunjungan dari batch bisa berada di tengah laporan: minta client memuat ulang
+            EVENTS.publish(EVENTS.RESET, {})
+            recorded = sum(1 for result in results if result.status == CheckInResult.RECORDED)
+            models_logger.info("Batch check-in recorded %s of %s events, %s payments created", recorded, len(events), len(payments))
+            return results
         except sqlite3.Error as e:
-            models_logger.error(f"Error creating attendance for {member_code}: {e}")
+            conn.rollback()
+            models_logger.error("Error during batch check-in: %s", e)
             raise
         finally:
             conn.close()
 
     @staticmethod
-    def get_all() -> List[Dict]:
-        # Mendapatkan semua catatan kehadiran untuk ditampilkan
+    def _report_query(conditions: List[str]) -> str:
+        # Query laporan kehadiran (terbaru dulu) dengan kondisi WHERE opsional
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return f'''
+            SELECT
+                attendance_log.id,
+                attendance_log.member_code,
+                members.name,
+                attendance_log.visit_number,
+                attendance_log.timestamp
+            FROM attendance_log
+            JOIN members ON attendance_log.member_code = members.member_code
+            {where}
+            ORDER BY attendance_log.timestamp DESC, attendance_log.id DESC
+        '''
+
+    @staticmethod
+    def _row_factory(cursor: sqlite3.Cursor, row: tuple) -> 'AttendanceLog.Row':
+        return AttendanceLog.Row._make(row)
+
+    @staticmethod
+    @timed('AttendanceLog.get_page')
+    def get_page(limit: int, cursor: Optional[str] = None, member_code: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[List['AttendanceLog.Row'], Optional[str]]:
+        # Mendapatkan satu halaman catatan kehadiran (terbaru dulu) dengan keyset pagination.
+        # Mengembalikan (rows, next_cursor); next_cursor None jika ini halaman terakhir.
         try:
             conn = Database.get_connection()
+            conditions, params = Database.page_filters('attendance_log', cursor, member_code, date_from, date_to)
             c = conn.cursor()
-            c.execute('''
-                SELECT 
-                    attendance_log.member_code,
-                    members.name,
-                    attendance_log.visit_number
-                FROM attendance_log
-                JOIN members ON attendance_log.member_code = members.member_code
-                ORDER BY attendance_log.timestamp DESC
-            ''')
-            result = [{
-                'memberCode': row[0],
-                'member': row[1],
-                'visitNumber': row[2]
-            } for row in c.fetchall()]
-            models_logger.info(f"Retrieved all attendance records. Total records: {len(result)}")
-            return result
+            c.row_factory = AttendanceLog._row_factory
+            c.execute(AttendanceLog._report_query(conditions) + ' LIMIT ?', params + [limit + 1])
+            rows = c.fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = Database.encode_cursor(rows[-1][4], rows[-1][0])
+            models_logger.info("Retrieved attendance page. Records: %s", len(rows))
+            return rows, next_cursor
         except sqlite3.Error as e:
-            models_logger.error(f"Error retrieving attendance records: {e}")
+            models_logger.error("Error retrieving attendance page: %s", e)
             raise
         finally:
             conn.close()
 
-
-    def reset_visit_number(self, new_count: int) -> None:
-        # Mengatur ulang visit_number anggota tertentu
+    @staticmethod
+    def iter_all(member_code: Optional[str] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None) -> Iterator['AttendanceLog.Row']:
+        # Mengiterasi seluruh catatan kehadiran langsung dari cursor (untuk download),
+        # tanpa memuat semua baris ke memori
+        conn = Database.get_connection()
         try:
-            conn= Database.get_connection()
+            conditions, params = Database.page_filters('attendance_log', None, member_code, date_from, date_to)
             c = conn.cursor()
-            c.execute('''
-                UPDATE attendance_log 
-                SET visit_number = ? 
-                WHERE member_code = ?
-            ''', (new_count, self.member_code))
-            conn.commit()
-            self.visit_number = new_count
-            models_logger.info(f"Visit number reset for member code: {self.member_code} to {new_count}")
+            c.row_factory = AttendanceLog._row_factory
+            c.execute(AttendanceLog._report_query(conditions), params)
+            while True:
+                rows = c.fetchmany(Config.EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
         except sqlite3.Error as e:
-            models_logger.error(f"Error resetting visit number for {self.member_code}: {e}")
+            models_logger.error("Error streaming attendance records: %s", e)
             raise
         finally:
             conn.close()
 
 
 class PaymentLog:
+    __slots__ = ('id', 'member_code', 'payment_due', 'paid', 'timestamp')
+
+    # Key untuk baris laporan pembayaran (sesuai urutan kolom _report_query)
+    REPORT_KEYS = ('id', 'memberCode', 'member', 'amount', 'paid', 'timestamp')
+    Row = namedtuple('PaymentRow', REPORT_KEYS)
+
     # Inisialisasi objek Catatan Pembayaran
     def __init__(self, member_code: str, payment_due: int, timestamp: datetime, paid: bool = False, id: Optional[int] = None):
         self.id = id
@@ -257,28 +1589,48 @@ class PaymentLog:
         self.timestamp = timestamp
 
     @staticmethod
+    @timed('PaymentLog.create')
+    @retry_on_busy
     def create(member_code: str, payment_due: int) -> 'PaymentLog':
         # Membuat catatan pembayaran baru
-        try:
-            conn = Database.get_connection()
-            now = datetime.now()
-            c = conn.cursor()
+        now = datetime.now()
+
+        def job(c):
             c.execute('''
                 INSERT INTO payment_log (member_code, payment_due, paid, timestamp)
                 VALUES (?, ?, FALSE, ?)
             ''', (member_code, payment_due, now.strftime('%Y-%m-%d %H:%M:%S')))
-            conn.commit()
-            models_logger.info(f"Payment record created for member code: {member_code} with payment of {payment_due}")
-            return PaymentLog(member_code, payment_due, now)
+            payment = PaymentLog(member_code, payment_due, now, False, c.lastrowid)
+            DailyRollup.add_member_due(c, member_code, now.strftime('%Y-%m-%d'), payment_due)
+            return payment, lambda: PaymentLog._after_create(payment)
+
+        try:
+            payment = WriteQueue.run(job)
+            models_logger.info("Payment record created for member code: %s with payment of %s", member_code, payment_due)
+            return payment
         except sqlite3.Error as e:
-            models_logger.error(f"Error creating payment record for {member_code}: {e}")
+            models_logger.error("Error creating payment record for %s: %s", member_code, e)
             raise
-        finally:
-            conn.close()
 
     @staticmethod
-    def get_unpaid(member_code: str) -> Optional['PaymentLog']:
+    def _after_create(payment: 'PaymentLog') -> None:
+        BillingState.invalidate(payment.member_code)
+        member = Member.get_by_code(payment.member_code)
+        EVENTS.publish('payment_due', PaymentLog.Row(
+            payment.id, payment.member_code, member.name if member else None,
+            payment.payment_due, False, payment.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        )._asdict())
+
+    @staticmethod
+    @timed('PaymentLog.get_unpaid')
+    def get_unpaid(member_code: str, use_cache: bool = True) -> Optional['PaymentLog']:
         # Mendapatkan iuran yang belum dibayar anggota
+        if use_cache:
+            payment = BillingState.get(member_code).unpaid
+            if payment:
+                models_logger.info("Unpaid payment found for member %s with payment of %s", member_code, payment.payment_due)
+            return payment
+
         try:
             conn = Database.get_connection()
             c = conn.cursor()
@@ -288,7 +1640,7 @@ class PaymentLog:
             ''', (member_code,))
             row = c.fetchone()
             if row:
-                models_logger.info(f"Unpaid payment found for member {member_code} with payment of {row['payment_due']}")
+                models_logger.info("Unpaid payment found for member %s with payment of %s", member_code, row['payment_due'])
                 return PaymentLog(
                     row['member_code'],
                     row['payment_due'],
@@ -300,57 +1652,338 @@ class PaymentLog:
             return None
         
         except sqlite3.Error as e:
-            models_logger.error(f"Error fetching unpaid payment for member {member_code}: {e}")
+            models_logger.error("Error fetching unpaid payment for member %s: %s", member_code, e)
             raise
         finally:
             conn.close()
 
     @staticmethod
-    def get_all() -> List[Dict]:
-        # Digunakan untuk menampilkan iuran yang belum dibayar
+    def _report_query(conditions: List[str]) -> str:
+        # Query laporan pembayaran (terbaru dulu) dengan kondisi WHERE opsional
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return f'''
+            SELECT
+                payment_log.id,
+                payment_log.member_code,
+                members.name,
+                payment_log.payment_due,
+                payment_log.paid,
+                payment_log.timestamp
+            FROM payment_log
+            JOIN members ON payment_log.member_code = members.member_code
+            {where}
+            ORDER BY payment_log.timestamp DESC, payment_log.id DESC
+        '''
+
+    @staticmethod
+    def _report_conditions(cursor: Optional[str], member_code: Optional[str], date_from: Optional[str],
+                           date_to: Optional[str], paid: Optional[bool]) -> Tuple[List[str], List[Any]]:
+        conditions, params = Database.page_filters('payment_log', cursor, member_code, date_from, date_to)
+        if paid is not None:
+            conditions.append('payment_log.paid = TRUE' if paid else 'payment_log.paid = FALSE')
+        return conditions, params
+
+    @staticmethod
+    def _row_factory(cursor: sqlite3.Cursor, row: tuple) -> 'PaymentLog.Row':
+        return PaymentLog.Row(row[0], row[1], row[2], row[3], bool(row[4]), row[5])
+
+    @staticmethod
+    @timed('PaymentLog.get_page')
+    def get_page(limit: int, cursor: Optional[str] = None, member_code: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 paid: Optional[bool] = None) -> Tuple[List['PaymentLog.Row'], Optional[str]]:
+        # Mendapatkan satu halaman catatan pembayaran (terbaru dulu) dengan keyset pagination
         try:
             conn = Database.get_connection()
+            conditions, params = PaymentLog._report_conditions(cursor, member_code, date_from, date_to, paid)
+            c = conn.cursor()
+            c.row_factory = PaymentLog._row_factory
+            c.execute(PaymentLog._report_query(conditions) + ' LIMIT ?', params + [limit + 1])
+            rows = c.fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = Database.encode_cursor(rows[-1][5], rows[-1][0])
+            models_logger.info("Fetched payment page. Records: %s", len(rows))
+            return rows, next_cursor
+        except sqlite3.Error as e:
+            models_logger.error("Error retrieving payment page: %s", e)
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def iter_all(member_code: Optional[str] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None, paid: Optional[bool] = None) -> Iterator['PaymentLog.Row']:
+        # Mengiterasi seluruh catatan pembayaran langsung dari cursor (untuk download)
+        conn = Database.get_connection()
+        try:
+            conditions, params = PaymentLog._report_conditions(None, member_code, date_from, date_to, paid)
             c = conn.cursor()
+            c.row_factory = PaymentLog._row_factory
+            c.execute(PaymentLog._report_query(conditions), params)
+            while True:
+                rows = c.fetchmany(Config.EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        except sqlite3.Error as e:
+            models_logger.error("Error streaming payment records: %s", e)
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    @timed('PaymentLog.settle')
+    @retry_on_busy
+    def settle(member_code: str) -> Optional['PaymentLog']:
+        # Pembayaran dari /api/pay: semua tagihan yang belum dibayar ditandai lunas,
+        # visit_number di-reset ke 0 dan rollup diperbarui dalam satu transaksi,
+        # sehingga check-in di antaranya tidak bisa menambah kunjungan pada siklus
+        # yang sudah ditagih. Mengembalikan None jika tidak ada tagihan.
+        now = datetime.now()
+
+        def job(c):
             c.execute('''
-                SELECT 
-                    payment_log.member_code,
-                    members.name,
-                    payment_log.payment_due,
-                    payment_log.paid
+                SELECT payment_log.id, payment_log.payment_due, payment_log.timestamp, members.transport
                 FROM payment_log
                 JOIN members ON payment_log.member_code = members.member_code
-                ORDER BY payment_log.timestamp DESC
-            ''')
-            result = [{
-                'memberCode': row[0],
-                'member': row[1],
-                'amount': row[2],
-                'paid': row[3]
-            } for row in c.fetchall()]
-            models_logger.info(f"Fetched all payment records. Total records: {len(result)}")
-            return result
+                WHERE payment_log.member_code = ? AND paid = FALSE
+                ORDER BY payment_log.timestamp, payment_log.id
+            ''', (member_code,))
+            rows = c.fetchall()
+            if not rows:
+                return None, None
+            c.execute('''
+                UPDATE payment_log
+                SET paid = TRUE, paid_at = ?
+                WHERE member_code = ? AND paid = FALSE
+            ''', (now.strftime('%Y-%m-%d %H:%M:%S'), member_code))
+            c.execute('UPDATE member_visit_state SET visit_number = 0 WHERE member_code = ?', (member_code,))
+            collected = {}
+            for row in rows:
+                collected[row['transport']] = collected.get(row['transport'], 0) + row['payment_due']
+            DailyRollup.add_revenue(c, [
+                (now.strftime('%Y-%m-%d'), transport, 0, amount) for transport, amount in collected.items()
+            ])
+            payment = PaymentLog(member_code, rows[0]['payment_due'], rows[0]['timestamp'], True, rows[0]['id'])
+
+            def after_commit():
+                BillingState.invalidate(member_code)
+                EVENTS.publish('payment_paid', {'memberCode': member_code})
+            return payment, after_commit
+
+        try:
+            payment = WriteQueue.run(job)
+        except sqlite3.Error as e:
+            models_logger.error("Error settling payment for member %s: %s", member_code, e)
+            raise
+        if payment:
+            models_logger.info("Payment settled and visit number reset for member %s", member_code)
+        return payment
+
+
+class BillingState:
+    # State tagihan anggota saat ini: attendance terakhir (visit_number) dan
+    # tagihan yang belum dibayar. Di-cache per anggota dan di-invalidate setiap
+    # kali attendance atau payment anggota tersebut berubah.
+    cache = TTLCache('billing_state', 'BILLING_CACHE_SIZE', 'BILLING_CACHE_TTL_SECONDS')
+
+    __slots__ = ('attendance', 'unpaid')
+
+    def __init__(self, attendance: Optional[AttendanceLog], unpaid: Optional[PaymentLog]):
+        self.attendance = attendance
+        self.unpaid = unpaid
+
+    @property
+    def visit_number(self) -> int:
+        return self.attendance.visit_number if self.attendance else 0
+
+    @staticmethod
+    @timed('BillingState.get')
+    def get(member_code: str) -> 'BillingState':
+        # Mengambil state dari cache, atau membaca keduanya dengan satu query
+        cached = BillingState.cache.get(member_code)
+        if cached is not TTLCache.MISSING:
+            return cached
+
+        try:
+            conn = Database.get_connection()
+            c = conn.cursor()
+            c.execute('''
+                SELECT
+                    member_visit_state.visit_number,
+                    member_visit_state.last_visit,
+                    (
+                        SELECT id FROM attendance_log
+                        WHERE attendance_log.member_code = target.member_code
+                        ORDER BY timestamp DESC LIMIT 1
+                    ) AS attendance_id,
+                    payment_log.id AS payment_id,
+                    payment_log.payment_due,
+                    payment_log.paid,
+                    payment_log.timestamp AS payment_timestamp
+                FROM (SELECT ? AS member_code) AS target
+                LEFT JOIN member_visit_state ON member_visit_state.member_code = target.member_code
+                LEFT JOIN payment_log ON payment_log.id = (
+                    SELECT id FROM payment_log
+                    WHERE payment_log.member_code = target.member_code AND paid = FALSE
+                    LIMIT 1
+                )
+            ''', (member_code,))
+            row = c.fetchone()
+
+            attendance = None
+            if row['visit_number'] is not None:
+                attendance = AttendanceLog(
+                    member_code,
+                    datetime.fromisoformat(row['last_visit']),
+                    row['visit_number'],
+                    row['attendance_id']
+                )
+            unpaid = None
+            if row['payment_id'] is not None:
+                unpaid = PaymentLog(
+                    member_code,
+                    row['payment_due'],
+                    row['payment_timestamp'],
+                    row['paid'],
+                    row['payment_id']
+                )
+
+            state = BillingState(attendance, unpaid)
+            BillingState.cache.set(member_code, state)
+            return state
         except sqlite3.Error as e:
-            models_logger.error(f"Error retrieving payment records: {e}")
+            models_logger.error("Error retrieving billing state for %s: %s", member_code, e)
             raise
         finally:
             conn.close()
 
+    @staticmethod
+    def invalidate(member_code: str) -> None:
+        BillingState.cache.invalidate(member_code)
+
+
+class DailyRollup:
+    # Rollup harian (kunjungan dan pendapatan per jenis transport) yang diperbarui
+    # di dalam transaksi yang sama dengan check-in dan pembayaran. Dashboard cukup
+    # membaca satu baris per (hari, transport), bukan memindai log mentah.
+
+    @staticmethod
+    def add_visits(c: sqlite3.Cursor, rows: List[tuple]) -> None:
+        # rows berisi (day, transport, visits)
+        c.executemany('''
+            INSERT INTO daily_attendance (day, transport, visits)
+            VALUES (?, ?, ?)
+            ON CONFLICT (day, transport) DO UPDATE SET visits = visits + excluded.visits
+        ''', rows)
+
+    @staticmethod
+    def add_revenue(c: sqlite3.Cursor, rows: List[tuple]) -> None:
+        # rows berisi (day, transport, due, collected)
+        c.executemany('''
+            INSERT INTO daily_revenue (day, transport, due, collected)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (day, transport) DO UPDATE SET
+                due = due + excluded.due,
+                collected = collected + excluded.collected
+        ''', rows)
+
+    @staticmethod
+    def add_member_visit(c: sqlite3.Cursor, member_code: str, day: str) -> None:
+        # Seperti add_visits, tetapi transport dibaca dari tabel members
+        c.execute('''
+            INSERT INTO daily_attendance (day, transport, visits)
+            SELECT ?, transport, 1 FROM members WHERE member_code = ?
+            ON CONFLICT (day, transport) DO UPDATE SET visits = visits + excluded.visits
+        ''', (day, member_code))
+
+    @staticmethod
+    def add_member_due(c: sqlite3.Cursor, member_code: str, day: str, amount: int) -> None:
+        c.execute('''
+            INSERT INTO daily_revenue (day, transport, due, collected)
+            SELECT ?, transport, ?, 0 FROM members WHERE member_code = ?
+            ON CONFLICT (day, transport) DO UPDATE SET due = due + excluded.due
+        ''', (day, amount, member_code))
 
-    def mark_as_paid(self) -> None:
-        # Digunakan untuk menandakan iuran telah terbayar
+    @staticmethod
+    @timed('DailyRollup.rebuild')
+    @retry_on_busy
+    def rebuild() -> None:
+        # Menghitung ulang semua rollup dari attendance_log dan payment_log.
+        # Catatan: sebelum migrasi 5, attendance_log hanya menyimpan kunjungan terakhir
+        # per anggota, sehingga kunjungan lama dari periode itu tidak bisa dihitung ulang.
         try:
             conn = Database.get_connection()
             c = conn.cursor()
-            c.execute('''
-                UPDATE payment_log 
-                SET paid = TRUE 
-                WHERE member_code = ? AND paid = FALSE
-            ''', (self.member_code,))
+            c.execute('BEGIN IMMEDIATE')
+            for statement in ROLLUP_REBUILD_STATEMENTS:
+                c.execute(statement)
             conn.commit()
-            self.paid = True
-            models_logger.info(f"Payment marked as paid for member {self.member_code}")
+            models_logger.info("Daily rollups rebuilt")
+        except sqlite3.Error as e:
+            conn.rollback()
+            models_logger.error("Error rebuilding daily rollups: %s", e)
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    @timed('DailyRollup.get_dashboard')
+    def get_dashboard(date_from: str, date_to: str) -> Dict[str, Any]:
+        # Ringkasan per hari dan per transport untuk rentang tanggal (inklusif),
+        # plus saldo yang belum dibayar per transport
+        try:
+            conn = Database.get_connection()
+            c = conn.cursor()
+            c.execute('''
+                SELECT day, transport, SUM(visits), SUM(due), SUM(collected)
+                FROM (
+                    SELECT day, transport, visits, 0 AS due, 0 AS collected
+                    FROM daily_attendance WHERE day BETWEEN ? AND ?
+                    UNION ALL
+                    SELECT day, transport, 0, due, collected
+                    FROM daily_revenue WHERE day BETWEEN ? AND ?
+                )
+                GROUP BY day, transport
+                ORDER BY day, transport
+            ''', (date_from, date_to, date_from, date_to))
+
+            days = {}
+            totals = {'visits': 0, 'due': 0, 'collected': 0}
+            for day, transport, visits, due, collected in c.fetchall():
+                entry = days.setdefault(day, {'day': day, 'visits': 0, 'due': 0, 'collected': 0, 'transport': {}})
+                entry['transport'][transport] = {'visits': visits, 'due': due, 'collected': collected}
+                for key, value in (('visits', visits), ('due', due), ('collected', collected)):
+                    entry[key] += value
+                    totals[key] += value
+
+            c.execute('''
+                SELECT transport, SUM(due) - SUM(collected)
+                FROM daily_revenue
+                GROUP BY transport
+            ''')
+            outstanding = {transport: amount for transport, amount in c.fetchall()}
+
+            return {
+                'from': date_from,
+                'to': date_to,
+                'days': list(days.values()),
+                'totals': totals,
+                'outstanding': outstanding
+            }
         except sqlite3.Error as e:
-            models_logger.error(f"Error marking payment as paid for member {self.member_code}: {e}")
+            models_logger.error("Error reading dashboard rollups: %s", e)
             raise
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    # Statistik hit/miss untuk semua cache di model layer
+    return {
+        'members': Member.cache.stats(),
+        'billing_state': BillingState.cache.stats(),
+        'pricing': FeeSchedule.cache.stats()
+    }
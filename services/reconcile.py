@@ -0,0 +1,315 @@
+import argparse
+import calendar
+import json
+import sqlite3
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from .config import Config
+from .models import Database, FeeSchedule, models_logger
+
+
+class Reconciliation:
+    # Audit tagihan secara batch: riwayat attendance dan payment dimuat sebagai
+    # kolom (array per kolom, diurutkan per anggota lalu waktu) dengan beberapa
+    # query saja, lalu tagihan yang seharusnya ada dihitung ulang per anggota
+    # dengan plan tarif yang berlaku saat itu, tanpa query per anggota.
+    # Hasilnya daftar selisih dan aging tagihan.
+    MISSED_BILLING = 'missed_billing'
+    DOUBLE_BILLING = 'double_billing'
+    PAYMENT_WITHOUT_ATTENDANCE = 'payment_without_attendance'
+    WRONG_AMOUNT = 'wrong_amount'
+    UNKNOWN_MEMBER = 'unknown_member'
+    # Bukan selisih: tagihan dari sebelum migrasi 5 yang tidak bisa diperiksa
+    LEGACY_HISTORY = 'legacy_history'
+
+    Discrepancy = namedtuple('Discrepancy', ('kind', 'member_code', 'payment_id', 'detail'))
+
+    # Timestamp disimpan sebagai teks waktu lokal; strftime('%s') mengubahnya ke
+    # detik tanpa zona waktu, sama seperti calendar.timegm() untuk waktu sekarang
+    EPOCH = "CAST(strftime('%s', timestamp) AS INTEGER)"
+
+    @staticmethod
+    def _load_offsets(c: sqlite3.Cursor, table: str) -> Dict[str, Tuple[int, int]]:
+        # Posisi (awal, akhir) baris setiap anggota di kolom yang diurutkan per member_code
+        c.execute(f'SELECT member_code, COUNT(*) FROM {table} GROUP BY member_code ORDER BY member_code')
+        offsets = {}
+        start = 0
+        for member_code, count in c:
+            offsets[member_code] = (start, start + count)
+            start += count
+        return offsets
+
+    @staticmethod
+    def load(c: sqlite3.Cursor) -> Dict[str, Any]:
+        # Memuat riwayat dalam bentuk kolom. Kedua query memakai urutan index
+        # (member_code, timestamp), sehingga tidak perlu sort tambahan.
+        plans = FeeSchedule.load(c)
+        c.row_factory = None
+        c.execute('SELECT member_code, transport FROM members')
+        transports = dict(c)
+
+        attendance = Reconciliation._load_offsets(c, 'attendance_log')
+        c.execute(f'SELECT {Reconciliation.EPOCH} FROM attendance_log ORDER BY member_code, timestamp')
+        attendance_times = array('q', (row[0] for row in c))
+        # visit_number baris attendance pertama setiap anggota (untuk mengenali riwayat lama)
+        c.execute('SELECT member_code, visit_number, MIN(timestamp) FROM attendance_log GROUP BY member_code')
+        first_visits = {member_code: visit_number for member_code, visit_number, _ in c}
+
+        payments = Reconciliation._load_offsets(c, 'payment_log')
+        c.execute(f'''
+            SELECT id, payment_due, paid, {Reconciliation.EPOCH}
+            FROM payment_log ORDER BY member_code, timestamp, id
+        ''')
+        payment_ids, payment_dues, payment_paid, payment_times = array('q'), array('q'), array('b'), array('q')
+        for payment_id, payment_due, paid, timestamp in c:
+            payment_ids.append(payment_id)
+            payment_dues.append(payment_due)
+            payment_paid.append(bool(paid))
+            payment_times.append(timestamp)
+
+        return {
+            'plans': plans,
+            'transports': transports,
+            'attendance': attendance,
+            'attendance_times': attendance_times,
+            'first_visits': first_visits,
+            'payments': payments,
+            'payment_ids': payment_ids,
+            'payment_dues': payment_dues,
+            'payment_paid': payment_paid,
+            'payment_times': payment_times
+        }
+
+    @staticmethod
+    def aging_labels() -> List[str]:
+        # Label kelompok aging, mis. ['0-30', '31-60', '61-90', '91+']
+        labels, lower = [], 0
+        for upper in Config.AGING_BUCKET_DAYS:
+            labels.append(f"{lower}-{upper}")
+            lower = upper + 1
+        labels.append(f"{lower}+")
+        return labels
+
+    @staticmethod
+    def epoch(timestamp: str) -> int:
+        return calendar.timegm(datetime.fromisoformat(timestamp).timetuple())
+
+    @staticmethod
+    def analyze(columns: Dict[str, Any], as_of: datetime) -> Dict[str, Any]:
+        # Menghitung ulang tagihan per anggota. Sebuah tagihan sah jika sejak tagihan
+        # sah sebelumnya anggota sudah menyelesaikan visits_per_payment kunjungan
+        # menurut plan yang berlaku saat tagihan dibuat. Jumlah kunjungan sampai
+        # waktu tagihan dicari dengan binary search pada kolom waktu attendance.
+        # Sebelum migrasi 5 setiap anggota hanya punya satu baris attendance yang
+        # di-update, dengan visit_number = kunjungan sejak pembayaran terakhir.
+        # Baris itu tetap menjadi baris pertama anggota dan dikenali dari
+        # visit_number selain 1 atau tagihan yang lebih tua darinya; baris itu
+        # dihitung sebagai visit_number kunjungan, dan tagihan sampai waktu baris
+        # itu dilaporkan sebagai legacy_history, bukan sebagai selisih.
+        transports = columns['transports']
+        attendance, attendance_times = columns['attendance'], columns['attendance_times']
+        first_visits = columns['first_visits']
+        payments = columns['payments']
+        ids, dues = columns['payment_ids'], columns['payment_dues']
+        paid, times = columns['payment_paid'], columns['payment_times']
+
+        # Plan per transport dengan waktu mulai berlaku dalam detik (sama seperti kolom waktu)
+        schedule = {
+            transport: ([Reconciliation.epoch(start) for start in starts], versions)
+            for transport, (starts, versions) in columns['plans'].items()
+        }
+
+        def plan_at(transport, at):
+            starts, versions = schedule.get(transport, ((), ()))
+            index = bisect_right(starts, at) - 1
+            return versions[index] if index >= 0 else None
+
+        now = calendar.timegm(as_of.timetuple())
+        bucket_days = Config.AGING_BUCKET_DAYS
+        aging_count = [0] * (len(bucket_days) + 1)
+        aging_amount = [0] * (len(bucket_days) + 1)
+        balances: Dict[str, int] = {}
+        discrepancies = []
+        legacy = []
+        expected_bills = billed = 0
+
+        for member_code in attendance.keys() | payments.keys():
+            transport = transports.get(member_code)
+            if transport is None:
+                discrepancies.append(Reconciliation.Discrepancy(
+                    Reconciliation.UNKNOWN_MEMBER, member_code, None, 'history for a member that does not exist'
+                ))
+            a_start, a_end = attendance.get(member_code, (0, 0))
+            p_start, p_end = payments.get(member_code, (0, 0))
+            # Jumlah kunjungan sampai tagihan sah terakhir
+            billed_visits = 0
+            # Waktu baris riwayat lama dan kunjungan tambahan yang diwakilinya
+            legacy_at, offset = None, 0
+            if a_end > a_start and (first_visits.get(member_code) != 1
+                                    or (p_end > p_start and times[p_start] < attendance_times[a_start])):
+                legacy_at, offset = attendance_times[a_start], first_visits.get(member_code, 1) - 1
+
+            for p in range(p_start, p_end):
+                visits = bisect_right(attendance_times, times[p], a_start, a_end) - a_start
+                if visits:
+                    visits += offset
+                since = visits - billed_visits
+                plan = plan_at(transport, times[p])
+                if legacy_at is not None and times[p] <= legacy_at:
+                    legacy.append(Reconciliation.Discrepancy(
+                        Reconciliation.LEGACY_HISTORY, member_code, ids[p],
+                        'bill from before append-only attendance (migration 5), not checked'
+                    ))
+                    expected_bills += 1
+                    billed_visits = visits
+                elif plan is None:
+                    # Anggota tidak dikenal atau transport tanpa plan: siklus tidak bisa diperiksa
+                    pass
+                elif since == 0 and p > p_start:
+                    discrepancies.append(Reconciliation.Discrepancy(
+                        Reconciliation.DOUBLE_BILLING, member_code, ids[p],
+                        'no visits since the previous bill'
+                    ))
+                elif since < plan.visits_per_payment:
+                    discrepancies.append(Reconciliation.Discrepancy(
+                        Reconciliation.PAYMENT_WITHOUT_ATTENDANCE, member_code, ids[p],
+                        f"{since} visits before this bill, {plan.visits_per_payment} required"
+                    ))
+                else:
+                    missed = since // plan.visits_per_payment - 1
+                    if missed:
+                        discrepancies.append(Reconciliation.Discrepancy(
+                            Reconciliation.MISSED_BILLING, member_code, None,
+                            f"{missed} cycles not billed before payment {ids[p]}"
+                        ))
+                    expected_bills += missed + 1
+                    billed_visits = visits
+
+                if plan is not None and dues[p] != plan.payment_amount:
+                    discrepancies.append(Reconciliation.Discrepancy(
+                        Reconciliation.WRONG_AMOUNT, member_code, ids[p],
+                        f"billed {dues[p]}, expected {plan.payment_amount} (plan {plan.transport} v{plan.version})"
+                    ))
+                if not paid[p]:
+                    age = max(0, (now - times[p]) // 86400)
+                    bucket = bisect_left(bucket_days, age)
+                    aging_count[bucket] += 1
+                    aging_amount[bucket] += dues[p]
+                    balances[member_code] = balances.get(member_code, 0) + dues[p]
+
+            # Siklus yang sudah selesai setelah tagihan terakhir tetapi belum ditagih
+            plan = plan_at(transport, now)
+            if plan is not None:
+                missed = (a_end - a_start + offset - billed_visits) // plan.visits_per_payment
+                if missed:
+                    discrepancies.append(Reconciliation.Discrepancy(
+                        Reconciliation.MISSED_BILLING, member_code, None,
+                        f"{missed} completed cycles without a bill"
+                    ))
+                expected_bills += missed
+            billed += p_end - p_start
+
+        discrepancies.sort(key=lambda d: (d.member_code, d.payment_id or 0))
+        legacy.sort(key=lambda d: (d.member_code, d.payment_id))
+        summary = {kind: 0 for kind in (
+            Reconciliation.MISSED_BILLING, Reconciliation.DOUBLE_BILLING,
+            Reconciliation.PAYMENT_WITHOUT_ATTENDANCE, Reconciliation.WRONG_AMOUNT,
+            Reconciliation.UNKNOWN_MEMBER, Reconciliation.LEGACY_HISTORY
+        )}
+        for discrepancy in discrepancies + legacy:
+            summary[discrepancy.kind] += 1
+
+        return {
+            'as_of': as_of.strftime('%Y-%m-%d %H:%M:%S'),
+            'attendance_rows': len(attendance_times),
+            'payment_rows': len(ids),
+            'expected_bills': expected_bills,
+            'bills': billed,
+            'summary': summary,
+            'aging': [
+                {'bucket': label, 'count': count, 'amount': amount}
+                for label, count, amount in zip(Reconciliation.aging_labels(), aging_count, aging_amount)
+            ],
+            'overdue_balances': sorted(balances.items(), key=lambda item: item[1], reverse=True),
+            'discrepancies': discrepancies,
+            'legacy_history': legacy
+        }
+
+    @staticmethod
+    def run(as_of: Optional[datetime] = None) -> Dict[str, Any]:
+        # Memuat snapshot yang konsisten (satu transaksi baca) lalu menganalisisnya
+        as_of = as_of or datetime.now()
+        conn = Database.get_connection()
+        try:
+            started = time.perf_counter()
+            c = conn.cursor()
+            c.execute('BEGIN')
+            columns = Reconciliation.load(c)
+            conn.commit()
+            loaded = time.perf_counter() - started
+            report = Reconciliation.analyze(columns, as_of)
+            models_logger.info(
+                "Reconciliation: %s attendance rows, %s payment rows, %s discrepancies (load %.2fs, total %.2fs)",
+                report['attendance_rows'], report['payment_rows'], len(report['discrepancies']),
+                loaded, time.perf_counter() - started
+            )
+            return report
+        except sqlite3.Error as e:
+            conn.rollback()
+            models_logger.error("Error running reconciliation: %s", e)
+            raise
+        finally:
+            conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Recompute expected bills from attendance history and report discrepancies and unpaid aging.')
+    parser.add_argument('--db', help='Database to check (default: Config.DB_PATH)')
+    parser.add_argument('--as-of', help='Reference date for aging, YYYY-MM-DD (default: now)')
+    parser.add_argument('--limit', type=int, default=50, help='Discrepancies and balances to print (0 = all)')
+    parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        Config.update({'DB_PATH': args.db})
+    as_of = datetime.strptime(args.as_of, '%Y-%m-%d') if args.as_of else None
+
+    Database.ensure_initialized()
+    report = Reconciliation.run(as_of)
+    limit = args.limit or None
+
+    if args.json:
+        report['discrepancies'] = [d._asdict() for d in report['discrepancies']]
+        report['legacy_history'] = [d._asdict() for d in report['legacy_history']]
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"As of {report['as_of']}: {report['attendance_rows']} attendance rows, "
+              f"{report['payment_rows']} bills ({report['expected_bills']} expected)")
+        for kind, count in report['summary'].items():
+            print(f"{kind:28} {count:>10}")
+        print('\nUnpaid aging (days):')
+        for bucket in report['aging']:
+            print(f"{bucket['bucket']:>8} {bucket['count']:>10} bills {bucket['amount']:>16}")
+        if report['overdue_balances']:
+            print('\nLargest unpaid balances:')
+            for member_code, balance in report['overdue_balances'][:limit]:
+                print(f"{member_code:16} {balance:>16}")
+        if report['discrepancies']:
+            print('\nDiscrepancies:')
+            for d in report['discrepancies'][:limit]:
+                print(f"{d.kind:28} {d.member_code:16} {d.payment_id or '-':>10}  {d.detail}")
+        if report['legacy_history']:
+            print('\nBills from before append-only attendance (not checked):')
+            for d in report['legacy_history'][:limit]:
+                print(f"{d.member_code:16} {d.payment_id:>10}")
+    # Riwayat lama tidak memengaruhi exit status
+    return 1 if report['discrepancies'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional
+from .models import Database, DailyRollup
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Maintain the daily attendance and revenue rollups.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('rebuild', help='Recompute all rollups from attendance_log and payment_log')
+
+    show_parser = subparsers.add_parser('show', help='Print the dashboard summary as JSON')
+    show_parser.add_argument('--from', dest='date_from', help='First day (YYYY-MM-DD), default 30 days ago')
+    show_parser.add_argument('--to', dest='date_to', help='Last day (YYYY-MM-DD), default today')
+
+    args = parser.parse_args(argv)
+    Database.init_db()
+
+    if args.command == 'rebuild':
+        DailyRollup.rebuild()
+        print("Daily rollups rebuilt.")
+    else:
+        today = datetime.now().date()
+        date_to = args.date_to or today.strftime('%Y-%m-%d')
+        date_from = args.date_from or (today - timedelta(days=29)).strftime('%Y-%m-%d')
+        print(json.dumps(DailyRollup.get_dashboard(date_from, date_to), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from .config import Config
+
+# Nama untuk anggota sintetis
+FIRST_NAMES = ('Adi', 'Budi', 'Citra', 'Dewi', 'Eka', 'Fajar', 'Gita', 'Hadi', 'Indah', 'Joko',
+               'Kartika', 'Lestari', 'Made', 'Nur', 'Putri', 'Rina', 'Sari', 'Tono', 'Wati', 'Yusuf')
+LAST_NAMES = ('Santoso', 'Wijaya', 'Pratama', 'Saputra', 'Lestari', 'Hidayat', 'Kurniawan',
+              'Siregar', 'Nasution', 'Halim', 'Gunawan', 'Putra', 'Sari', 'Utami', 'Wibowo')
+
+
+def member_rows(count: int, rng: random.Random, transports: List[str]) -> Iterator[Tuple[str, str]]:
+    # (name, transport) untuk `count` anggota
+    for _ in range(count):
+        yield f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.choice(transports)
+
+
+def visit_times(count: int, rng: random.Random, days: int, end: datetime) -> List[str]:
+    # `count` timestamp acak (terurut) dalam `days` hari sebelum `end`
+    start = end - timedelta(days=days)
+    seconds = sorted(rng.randrange(days * 86400) for _ in range(count))
+    return [(start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S') for offset in seconds]
+
+
+def visit_counts(cycles: Dict[str, int], rows: int, unpaid: Set[str], rng: random.Random) -> Dict[str, int]:
+    # Membagi `rows` kunjungan secara acak ke anggota. Anggota di `unpaid` diberi
+    # kelipatan siklusnya (minimal satu siklus) agar riwayatnya berakhir tepat pada
+    # kunjungan yang membuat tagihan; selisihnya diambil dari atau diberikan ke
+    # anggota lain sehingga jumlah kunjungan tetap `rows` bila memungkinkan.
+    codes = list(cycles)
+    counts: Dict[str, int] = {}
+    for _ in range(rows):
+        code = codes[rng.randrange(len(codes))]
+        counts[code] = counts.get(code, 0) + 1
+
+    surplus = 0
+    for code in unpaid:
+        cycle = cycles[code]
+        count = counts.get(code, 0)
+        target = max(cycle, count - count % cycle)
+        counts[code] = target
+        surplus += target - count
+
+    paid = [code for code in codes if code not in unpaid]
+    while surplus > 0:
+        donors = [code for code in paid if counts.get(code)]
+        if not donors:
+            break
+        code = rng.choice(donors)
+        taken = min(surplus, counts[code])
+        counts[code] -= taken
+        surplus -= taken
+    while surplus < 0:
+        if paid:
+            code, step = rng.choice(paid), 1
+        else:
+            # Semua anggota belum bayar: hanya bisa ditambah per siklus penuh
+            fits = [code for code in unpaid if cycles[code] <= -surplus]
+            if not fits:
+                break
+            code = rng.choice(fits)
+            step = cycles[code]
+        counts[code] = counts.get(code, 0) + step
+        surplus += step
+    return counts
+
+
+def member_history(member_code: str, plan, timestamps: List[str], unpaid: bool) -> Dict[str, list]:
+    # Riwayat satu anggota yang konsisten dengan aturan check-in: visit_number naik
+    # 1..visits_per_payment, tagihan dibuat pada kunjungan ke-N lalu dibayar (dan
+    # visit_number di-reset), kecuali tagihan terakhir jika `unpaid`.
+    cycle = plan.visits_per_payment
+    attendance, payments = [], []
+    visit_number = 0
+    for index, timestamp in enumerate(timestamps):
+        visit_number += 1
+        attendance.append((member_code, timestamp, visit_number))
+        if visit_number == cycle:
+            paid = not (unpaid and index == len(timestamps) - 1)
+            payments.append((member_code, plan.payment_amount, paid, timestamp, timestamp if paid else None))
+            if paid:
+                visit_number = 0
+    state = (member_code, visit_number, timestamps[-1]) if timestamps else None
+    return {'attendance': attendance, 'payments': payments, 'state': state}
+
+
+def seed(members: int, rows: int, rng: random.Random, days: int = 365, unpaid_ratio: float = 0.0) -> List[str]:
+    # Mengisi database aktif (Config.DB_PATH) dengan `members` anggota dan `rows`
+    # kunjungan yang tersebar acak, beserta tagihan, state visit dan rollup harian.
+    # unpaid_ratio = bagian anggota yang tagihan terakhirnya belum dibayar
+    # (round(unpaid_ratio * members) anggota, dipilih acak).
+    # Seluruh riwayat memakai plan tarif yang berlaku sekarang.
+    from .models import Database, Member, DailyRollup, FeeSchedule
+
+    Database.ensure_initialized()
+    transports = FeeSchedule.transports()
+    created = []
+    for start in range(0, members, Config.IMPORT_CHUNK_SIZE):
+        size = min(Config.IMPORT_CHUNK_SIZE, members - start)
+        created.extend(Member.create_many(list(member_rows(size, rng, transports))))
+
+    plans = {member.member_code: FeeSchedule.plan_at(member.transport) for member in created}
+    unpaid_count = min(len(created), max(0, round(unpaid_ratio * len(created))))
+    unpaid = set(rng.sample([member.member_code for member in created], unpaid_count))
+    visits = visit_counts({code: plan.visits_per_payment for code, plan in plans.items()}, rows, unpaid, rng)
+
+    end = datetime.now()
+    conn = Database.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        for start in range(0, len(created), Config.IMPORT_CHUNK_SIZE):
+            attendance, payments, states = [], [], []
+            for member in created[start:start + Config.IMPORT_CHUNK_SIZE]:
+                count = visits.get(member.member_code)
+                if not count:
+                    continue
+                history = member_history(member.member_code, plans[member.member_code],
+                                         visit_times(count, rng, days, end), member.member_code in unpaid)
+                attendance.extend(history['attendance'])
+                payments.extend(history['payments'])
+                states.append(history['state'])
+            c.executemany('''
+                INSERT INTO attendance_log (member_code, timestamp, visit_number)
+                VALUES (?, ?, ?)
+            ''', attendance)
+            c.executemany('''
+                INSERT INTO payment_log (member_code, payment_due, paid, timestamp, paid_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', payments)
+            c.executemany('''
+                INSERT INTO member_visit_state (member_code, visit_number, last_visit)
+                VALUES (?, ?, ?)
+            ''', states)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    DailyRollup.rebuild()
+    return [member.member_code for member in created]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic members, attendance and payments.')
+    parser.add_argument('--db', required=True, help='Database file to create or extend (never the production database by default)')
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=10000, help='Number of attendance rows')
+    parser.add_argument('--days', type=int, default=365, help='Spread the attendance over this many days')
+    parser.add_argument('--unpaid-ratio', type=float, default=0.1, help='Share of members with an unpaid last bill')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    Config.update({'DB_PATH': args.db})
+    started = time.perf_counter()
+    codes = seed(args.members, args.rows, random.Random(args.seed), args.days, args.unpaid_ratio)
+    print(f"Seeded {len(codes)} members and {args.rows} attendance rows into {args.db} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# Entry point WSGI untuk production, contoh:
+#   gunicorn --workers 4 --threads 4 --preload services.wsgi:app
+#   waitress-serve --threads 8 services.wsgi:app
+from .app import create_app
+
+app = create_app()
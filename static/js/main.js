@@ -44,6 +44,7 @@ function loadAttendanceList() {
     $.get('/api/attendance-list')
     .done(function(response) {
         $('#reportData').html(response);
+        listenReportEvents();
     })
     .fail(function() {
         $('#reportData').html('<p>Error loading attendance list. Please try again later.</p>');
@@ -55,21 +56,111 @@ function loadPaymentList() {
     $.get('/api/payment-list')
     .done(function(response) {
         $('#reportData').html(response);
+        listenReportEvents();
     })
     .fail(function() {
         $('#reportData').html('<p>Error loading payment list. Please try again later.</p>');
     });
 }
 
+// Memuat halaman laporan berikutnya dan menambahkan barisnya ke tabel
+function loadMore() {
+    var button = $('#loadMoreBtn');
+    var params = new URLSearchParams(button.attr('data-query'));
+    params.set('cursor', button.attr('data-cursor'));
+
+    button.prop('disabled', true);
+    $.get(button.attr('data-url') + '?' + params.toString())
+    .done(function(response, status, xhr) {
+        $('#reportData table').append(response);
+        var nextCursor = xhr.getResponseHeader('X-Next-Cursor');
+        if (nextCursor) {
+            button.attr('data-cursor', nextCursor).prop('disabled', false);
+        } else {
+            button.remove();
+        }
+    })
+    .fail(function() {
+        button.prop('disabled', false);
+        alert('Error loading more data. Please try again later.');
+    });
+}
+
+// Live update laporan lewat Server-Sent Events: baris baru ditambahkan dan status
+// pembayaran diperbarui langsung di tabel, tanpa memuat ulang seluruh laporan
+var reportEvents = null;
+
+function listenReportEvents() {
+    if (reportEvents || !window.EventSource) {
+        return;
+    }
+    reportEvents = new EventSource('/api/events');
+
+    reportEvents.addEventListener('attendance', function(e) {
+        var row = JSON.parse(e.data);
+        var table = $('#reportData table[data-report="attendance"]');
+        if (!table.length || table.find(`tr[data-id="${row.id}"]`).length) {
+            return;
+        }
+        var tr = $('<tr>').attr('data-id', row.id)
+            .append($('<td>').text(row.memberCode))
+            .append($('<td>').text(row.member))
+            .append($('<td>').text(row.visitNumber));
+        table.find('tr').first().after(tr);
+    });
+
+    reportEvents.addEventListener('payment_due', function(e) {
+        var row = JSON.parse(e.data);
+        var table = $('#reportData table[data-report="payment"]');
+        if (!table.length || table.find(`tr[data-id="${row.id}"]`).length) {
+            return;
+        }
+        var button = $('<button type="button">').text('Pay Now').on('click', function() {
+            payNow(row.memberCode);
+        });
+        var tr = $('<tr>').attr({'data-id': row.id, 'data-member': row.memberCode})
+            .append($('<td>').text(row.memberCode))
+            .append($('<td>').text(row.member))
+            .append($('<td>').text(row.amount))
+            .append($('<td class="unpaid-status">').text('Unpaid'))
+            .append($('<td>').append(button));
+        table.find('tr').first().after(tr);
+    });
+
+    reportEvents.addEventListener('payment_paid', function(e) {
+        markPaid(JSON.parse(e.data).memberCode);
+    });
+
+    // Ada event yang terlewat (mis. server restart): muat ulang tabel yang sedang tampil
+    reportEvents.addEventListener('reset', function() {
+        if ($('#reportData table[data-report="attendance"]').length) {
+            loadAttendanceList();
+        } else if ($('#reportData table[data-report="payment"]').length) {
+            loadPaymentList();
+        }
+    });
+}
+
+// Tandai semua tagihan anggota sebagai lunas di tabel pembayaran
+function markPaid(memberCode) {
+    var rows = $('#reportData table[data-report="payment"] tr').filter(function() {
+        return $(this).attr('data-member') === memberCode;
+    });
+    rows.find('td.unpaid-status').removeClass('unpaid-status').addClass('paid-status').text('Paid');
+    rows.find('button').remove();
+}
+
 
 // Fungsi untuk membayar tagihan anggota
 function payNow(memberCode) {
     $.post('/api/pay', { code: memberCode })
     .done(function(response) {
         alert(response.message);  
-        loadPaymentList(); 
+        markPaid(memberCode);
     })
     .fail(function(xhr) {
-        alert(xhr.responseJSON.message);
+        // /api/pay mengirim pesan error pada key "error"
+        var body = xhr.responseJSON || {};
+        alert(body.error || body.message || 'Payment failed. Please try again later.');
     });
 }
\ No newline at end of file
@@ -0,0 +1,53 @@
+import tempfile
+import pytest
+from services.config import Config
+from services.logger_setup import LoggerSetup
+from services.app import create_app
+from services.models import BillingState, Database, FeeSchedule, Member
+
+# Nilai Config bawaan, dikembalikan setelah setiap test
+DEFAULTS = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+
+@pytest.fixture(scope='session', autouse=True)
+def log_dir():
+    # Log test ditulis ke direktori sementara, bukan ke logs/
+    path = tempfile.mkdtemp(prefix='fms-test-logs-')
+    Config.update({'LOG_PATH': path})
+    LoggerSetup.reload()
+    DEFAULTS['LOG_PATH'] = path
+    return path
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # Membuat aplikasi dengan database baru di tmp_path dan override Config tambahan
+    def factory(**overrides):
+        return create_app({'DB_PATH': str(tmp_path / 'test.db'), **overrides})
+
+    yield factory
+    Database.close_pool()
+    Config.update(DEFAULTS)
+    Member.cache.clear()
+    BillingState.cache.clear()
+    FeeSchedule.invalidate()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    # Mendaftarkan anggota baru lewat API dan mengembalikan kodenya
+    def register(name='Budi', transport='BUS'):
+        response = client.post('/api/register', data={'name': name, 'transport': transport})
+        assert response.status_code == 201
+        return response.get_json()['memberCode']
+    return register
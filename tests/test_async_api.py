@@ -0,0 +1,57 @@
+import asyncio
+import json
+import pytest
+from urllib.parse import urlencode
+from services import async_api
+from services.async_models import DatabaseExecutor
+from services.models import AttendanceLog
+
+
+@pytest.fixture
+def asgi(app):
+    async_api.startup()
+    yield
+    DatabaseExecutor.shutdown()
+
+
+def request(path, body, content_type):
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+             'headers': [(b'content-type', content_type.encode())]}
+    sent = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            sent['status'] = message['status']
+        else:
+            sent['body'] = json.loads(message['body'])
+
+    asyncio.run(async_api.app(scope, receive, send))
+    return sent['status'], sent['body']
+
+
+def multipart(fields):
+    boundary = 'fms-test-boundary'
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+             for name, value in fields.items()]
+    return ''.join(parts + [f'--{boundary}--\r\n']).encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def test_multipart_form_is_parsed_like_urlencoded(asgi):
+    status, body = request('/api/register', *multipart({'name': 'Adi', 'transport': 'BUS'}))
+    assert status == 201
+    code = body['memberCode']
+
+    status, body = request('/api/attendance', *multipart({'code': code}))
+    assert (status, body['message']) == (200, 'Attendance Recorded')
+    status, body = request('/api/attendance', urlencode({'code': code}).encode(), 'application/x-www-form-urlencoded')
+    assert (status, body['message']) == (200, 'Attendance Recorded')
+    assert AttendanceLog.get_last_attendance(code).visit_number == 2
+
+
+def test_unsupported_content_type_is_rejected(asgi):
+    status, body = request('/api/attendance', json.dumps({'code': 'MEM-00000018'}).encode(), 'application/json')
+    assert status == 415
+    assert 'application/json' in body['error']
@@ -0,0 +1,32 @@
+import io
+import json
+from services.models import Member
+
+
+def test_import_ndjson_rejects_rows_with_non_string_fields(client):
+    rows = [
+        {'name': 'Adi', 'transport': 'BUS'},
+        {'name': 123, 'transport': 'CAR'},
+        {'name': 'Budi', 'transport': 5},
+        'not an object',
+        {'name': 'Citra', 'transport': 'travel'},
+        {'name': '', 'transport': 'BUS'},
+    ]
+    body = '\n'.join(json.dumps(row) for row in rows) + '\n{broken json\n'
+    response = client.post('/api/members/import', data={
+        'file': (io.BytesIO(body.encode('utf-8')), 'members.ndjson')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    results = {result['line']: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert sorted(results) == [1, 2, 3, 4, 5, 6, 7]
+    assert results[2]['error'] == 'name must be a string'
+    assert results[3]['error'] == 'transport must be a string'
+    assert results[4]['error'] and results[6]['error'] and results[7]['error']
+
+    # Baris valid tetap tersimpan walaupun ada baris invalid di potongan yang sama
+    for line in (1, 5):
+        assert results[line]['error'] is None
+        member = Member.get_by_code(results[line]['member_code'])
+        assert member.name == results[line]['name']
+    assert results[5]['transport'] == 'TRAVEL'
@@ -0,0 +1,66 @@
+import sqlite3
+from services.config import Config
+from services.models import AttendanceLog, BillingState, CheckInResult, Database, Member
+
+
+def count_connections(monkeypatch):
+    calls = []
+    get_connection = Database.get_connection
+
+    def counting():
+        calls.append(1)
+        return get_connection()
+    monkeypatch.setattr(Database, 'get_connection', counting)
+    return calls
+
+
+def test_unknown_member_is_served_from_negative_cache(app, monkeypatch):
+    for code in ('MEM-ABCDEF', 'MEM-00000026'):
+        assert AttendanceLog.check_in(code).status == CheckInResult.INVALID_MEMBER
+        calls = count_connections(monkeypatch)
+        for _ in range(100):
+            assert AttendanceLog.check_in(code).status == CheckInResult.INVALID_MEMBER
+        assert calls == []
+        monkeypatch.undo()
+
+
+def test_registering_a_cached_unknown_code_makes_it_valid(app):
+    code = 'MEM-00000018'
+    assert AttendanceLog.check_in(code).status == CheckInResult.INVALID_MEMBER
+    assert Member.create('Adi', 'BUS').member_code == code
+    assert AttendanceLog.check_in(code).status == CheckInResult.RECORDED
+
+
+def test_cached_unpaid_bill_is_confirmed_against_the_database(app, register):
+    code = register()
+    for _ in range(5):
+        AttendanceLog.check_in(code)
+    assert AttendanceLog.check_in(code).status == CheckInResult.PAYMENT_REQUIRED
+    assert BillingState.get(code).unpaid is not None
+
+    # Dibayar lewat proses lain: cache di proses ini masih menyimpan tagihan
+    conn = sqlite3.connect(Config.DB_PATH)
+    conn.execute('UPDATE payment_log SET paid = TRUE WHERE member_code = ?', (code,))
+    conn.execute('UPDATE member_visit_state SET visit_number = 0 WHERE member_code = ?', (code,))
+    conn.commit()
+    conn.close()
+
+    result = AttendanceLog.check_in(code)
+    assert result.status == CheckInResult.RECORDED
+    assert result.visit_number == 1
+
+
+def test_cache_and_event_buffer_sizes_follow_create_app_overrides(make_app):
+    from services.events import EVENTS
+    make_app(MEMBER_CACHE_SIZE=2, MEMBER_CACHE_TTL_SECONDS=120, EVENT_BUFFER_SIZE=3)
+    for code in ('MEM-00000018', 'MEM-00000026', 'MEM-00000034'):
+        Member.get_by_code(code)
+    assert Member.cache.stats()['size'] == 2
+    assert Member.cache.ttl == 120
+
+    first = EVENTS.publish('test', {})
+    for _ in range(3):
+        EVENTS.publish('test', {})
+    # Hanya 3 event terakhir yang tersimpan: event `first` sudah keluar dari buffer
+    assert EVENTS.since(first - 1, 0) is None
+    assert len(EVENTS.since(first, 0)) == 3
@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+import pytest
+from services.config import Config
+from services.models import AttendanceLog, CheckInResult, PaymentLog
+
+
+def count_rows(table, member_code):
+    conn = sqlite3.connect(Config.DB_PATH)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table} WHERE member_code = ?', (member_code,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('group_commit', [False, True])
+def test_concurrent_check_ins_bill_one_cycle_once(make_app, group_commit):
+    app = make_app(GROUP_COMMIT_ENABLED=group_commit)
+    member_code = app.test_client().post(
+        '/api/register', data={'name': 'Adi', 'transport': 'BUS'}
+    ).get_json()['memberCode']
+    results, errors = [], []
+
+    def worker():
+        try:
+            for _ in range(10):
+                results.append(AttendanceLog.check_in(member_code))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert count_rows('attendance_log', member_code) == 5
+    assert count_rows('payment_log', member_code) == 1
+    recorded = [result for result in results if result.status == CheckInResult.RECORDED]
+    assert sorted(result.visit_number for result in recorded) == [1, 2, 3, 4, 5]
+    assert sum(1 for result in recorded if result.need_payment) == 1
+    assert len(results) - len(recorded) == 75
+
+
+def test_pay_is_idempotent(client, register):
+    member_code = register()
+    for _ in range(5):
+        client.post('/api/attendance', data={'code': member_code})
+
+    assert client.post('/api/pay', data={'code': member_code}).status_code == 200
+    response = client.post('/api/pay', data={'code': member_code})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'No unpaid payment'}
+    assert PaymentLog.settle(member_code) is None
+
+    dashboard = client.get('/api/dashboard').get_json()
+    assert dashboard['totals']['collected'] == dashboard['totals']['due'] == 500000
+    result = AttendanceLog.check_in(member_code)
+    assert (result.status, result.visit_number) == (CheckInResult.RECORDED, 1)
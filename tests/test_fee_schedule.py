@@ -0,0 +1,59 @@
+import threading
+import time
+from services.models import Database, FeeSchedule
+
+
+def test_plan_refresh_does_not_hold_the_lock_while_waiting_for_a_connection(make_app):
+    make_app(DB_POOL_SIZE=1, DB_POOL_TIMEOUT_SECONDS=3)
+    FeeSchedule.invalidate()
+    holding = threading.Event()
+    errors = []
+
+    def holder():
+        # Memegang satu-satunya koneksi pool, lalu membaca plan (seperti check-in)
+        conn = Database.get_connection()
+        try:
+            holding.set()
+            time.sleep(0.3)
+            FeeSchedule.plans()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    def refresher():
+        holding.wait()
+        try:
+            FeeSchedule.plans()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=holder), threading.Thread(target=refresher)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert time.monotonic() - started < 2
+
+
+def test_invalidate_during_load_is_not_overwritten(app, monkeypatch):
+    load = FeeSchedule.load
+
+    def load_then_invalidate(c):
+        plans = load(c)
+        FeeSchedule.invalidate()
+        return plans
+    monkeypatch.setattr(FeeSchedule, 'load', load_then_invalidate)
+    FeeSchedule.invalidate()
+    FeeSchedule.plans()
+    assert FeeSchedule._plans is None
+
+
+def test_seed_plans_do_not_depend_on_config(make_app):
+    make_app(VISITS_PER_PAYMENT=3)
+    plans = {plan.transport: plan for plan in FeeSchedule.list_plans(include_history=True)}
+    assert sorted(plans) == ['BUS', 'TRAVEL']
+    assert (plans['BUS'].fee, plans['BUS'].visits_per_payment) == (100000, 5)
+    assert (plans['TRAVEL'].fee, plans['TRAVEL'].visits_per_payment) == (50000, 5)
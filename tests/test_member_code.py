@@ -0,0 +1,21 @@
+from services.models import MemberCode
+
+
+def test_luhn_rejects_any_single_wrong_digit():
+    for number in (1, 42, 1234567, 99999999):
+        code = MemberCode.format(number)
+        assert MemberCode.is_valid(code)
+        digits = code[len(MemberCode.PREFIX):]
+        for position, original in enumerate(digits):
+            for replacement in '0123456789':
+                if replacement == original:
+                    continue
+                wrong = MemberCode.PREFIX + digits[:position] + replacement + digits[position + 1:]
+                assert not MemberCode.is_valid(wrong), wrong
+
+
+def test_rejects_malformed_codes():
+    # Termasuk digit non-ASCII (angka fullwidth) yang lolos str.isdigit()
+    for code in (None, 123, '', 'MEM-', 'MEM-0000001', 'MEM-0000001８', 'XYZ-00000018', 'MEM-GGGGGG'):
+        assert not MemberCode.is_valid(code)
+    assert MemberCode.is_valid('MEM-7F6CCC')
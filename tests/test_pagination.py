@@ -0,0 +1,21 @@
+from datetime import datetime
+from services.models import AttendanceLog, Member
+
+
+def test_keyset_cursor_is_stable_when_timestamps_tie(app):
+    members = Member.create_many([(f'Member {index}', 'BUS') for index in range(7)])
+    tied = datetime(2024, 11, 15, 8, 0, 0)
+    AttendanceLog.check_in_batch([(member.member_code, tied) for member in members])
+
+    first, cursor = AttendanceLog.get_page(3)
+    # Kunjungan baru (lebih baru dari cursor) tidak menggeser halaman berikutnya
+    AttendanceLog.check_in_batch([(members[0].member_code, datetime(2024, 11, 15, 9, 0, 0))])
+    seen = list(first)
+    while cursor is not None:
+        rows, cursor = AttendanceLog.get_page(3, cursor)
+        seen.extend(rows)
+
+    ids = [row.id for row in seen]
+    assert len(ids) == len(set(ids)) == 7
+    assert ids == sorted(ids, reverse=True)
+    assert {row.timestamp for row in seen} == {'2024-11-15 08:00:00'}